@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Process-wide cap on participants in the experiment at once.
+#
+# Every session's reruns share this process's script threads (and one GIL),
+# so past some number of concurrent participants each rerun waits on the
+# others and reaction_time_ms, which includes the rerun, drifts with load.
+# start_experiment() asks for a slot; without one the participant waits on a
+# small screen that polls from the browser (app.py) and is let in first come,
+# first served as slots free up.
+#
+# A slot is held from admission until the complete screen. Sessions that
+# stop rerunning (closed tab) lose their slot after idle_seconds; waiting
+# tickets that stop polling leave the queue after abandon_seconds (long
+# enough for a background tab, whose timers browsers slow to once a minute).
+# A started session this process does not know (resumed from a checkpoint,
+# or moved here from another worker) takes a free slot if there is one;
+# otherwise it waits at the front of the queue, so the cap holds.
+
+
+class AdmissionController:
+    """
+    limit: active participants allowed at once (0 = no limit)
+    idle_seconds: an active session with no rerun for this long is dropped
+    abandon_seconds: a waiting ticket not polled for this long leaves the queue
+    expected_session_s: session length assumed for wait estimates until
+         some sessions have completed
+    """
+
+    def __init__(self, limit, idle_seconds=600.0, abandon_seconds=120.0, expected_session_s=900.0):
+        self.limit = limit
+        self.idle_seconds = idle_seconds
+        self.abandon_seconds = abandon_seconds
+        self.expected_session_s = expected_session_s
+
+        self._lock = threading.Lock()
+        self._active = {}               # ticket -> (admitted_at, last_seen), monotonic
+        self._waiting = OrderedDict()   # ticket -> (queued_at, last_poll), arrival order
+        self._admits = deque()          # monotonic admit times over the last minute
+        self._session_s = None          # moving average of completed session length
+
+        self._admitted = 0
+        self._queued = 0
+        self._released = 0
+        self._expired = 0
+        self._abandoned = 0
+        self._max_queue = 0
+
+    def try_admit(self, ticket):
+        """
+        True if ticket holds (or now gets) a slot. Otherwise ticket is queued
+        (or stays queued) and False is returned; call again to poll.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if ticket in self._active:
+                self._active[ticket] = (self._active[ticket][0], now)
+                return True
+
+            position = self._position(ticket)
+            if position is None:
+                position = len(self._waiting)
+            if self.limit <= 0 or position < self.limit - len(self._active):
+                self._waiting.pop(ticket, None)
+                self._admit(ticket, now)
+                return True
+
+            if ticket in self._waiting:
+                self._waiting[ticket] = (self._waiting[ticket][0], now)
+            else:
+                self._waiting[ticket] = (now, now)
+                self._queued += 1
+                self._max_queue = max(self._max_queue, len(self._waiting))
+            return False
+
+    def heartbeat(self, ticket):
+        """
+        Keep a started session's slot. True if ticket holds a slot; a session
+        this process does not know yet is admitted only when one is free,
+        else it is queued ahead of the sessions that have not started and
+        False is returned (poll with try_admit).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if ticket in self._active:
+                self._active[ticket] = (self._active[ticket][0], now)
+                return True
+            if self.limit <= 0 or len(self._active) < self.limit:
+                self._waiting.pop(ticket, None)
+                self._admit(ticket, now)
+                return True
+            if ticket not in self._waiting:
+                self._waiting[ticket] = (now, now)
+                self._queued += 1
+                self._max_queue = max(self._max_queue, len(self._waiting))
+            self._waiting[ticket] = (self._waiting[ticket][0], now)
+            self._waiting.move_to_end(ticket, last=False)
+            return False
+
+    def release(self, ticket):
+        """Free ticket's slot (experiment complete); safe to call more than once"""
+        with self._lock:
+            entry = self._active.pop(ticket, None)
+            if entry is None:
+                return
+            self._released += 1
+            length = time.monotonic() - entry[0]
+            self._session_s = length if self._session_s is None else 0.8 * self._session_s + 0.2 * length
+
+    def queue_position(self, ticket):
+        """0-based place in the waiting queue, or None when not waiting"""
+        with self._lock:
+            return self._position(ticket)
+
+    def estimated_wait_s(self, position):
+        """Seconds until the waiting ticket at position is admitted, assuming slots free up evenly"""
+        with self._lock:
+            return self._estimate(position)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return {
+                "limit": self.limit,
+                "active": len(self._active),
+                "queue_length": len(self._waiting),
+                "max_queue_length": self._max_queue,
+                "admitted": self._admitted,
+                "admits_per_min": len(self._admits),
+                "queued": self._queued,
+                "released": self._released,
+                "expired": self._expired,
+                "abandoned": self._abandoned,
+                "avg_session_s": self._session_s,
+                "est_wait_s": self._estimate(len(self._waiting)) if self._waiting else 0.0,
+            }
+
+    # The helpers below expect self._lock to be held
+
+    def _admit(self, ticket, now):
+        self._active[ticket] = (now, now)
+        self._admitted += 1
+        self._admits.append(now)
+
+    def _position(self, ticket):
+        if ticket not in self._waiting:
+            return None
+        for i, waiting in enumerate(self._waiting):
+            if waiting == ticket:
+                return i
+
+    def _estimate(self, position):
+        if self.limit <= 0:
+            return 0.0
+        session_s = self._session_s or self.expected_session_s
+        # A slot frees up every session_s / limit seconds on average
+        return (position + 1) * session_s / self.limit
+
+    def _expire(self, now):
+        while self._admits and self._admits[0] < now - 60.0:
+            self._admits.popleft()
+        for ticket, (_, last_seen) in list(self._active.items()):
+            if now - last_seen > self.idle_seconds:
+                del self._active[ticket]
+                self._expired += 1
+        for ticket, (_, last_poll) in list(self._waiting.items()):
+            if now - last_poll > self.abandon_seconds:
+                del self._waiting[ticket]
+                self._abandoned += 1
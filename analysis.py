@@ -0,0 +1,385 @@
+"""
+Streak-conditional behaviour from exported trials.
+
+Risk-taking rates by condition and by participant, conditional on the
+streak a choice was made after and on whether the bias window was open,
+plus reaction times by condition:
+
+    python analysis.py export/
+    python analysis.py export/ --out summary.json --participants participants.parquet
+
+Input is a Parquet file or directory (e.g. from export_parquet.py) or a CSV
+of experiment_data. The data is streamed in batches and split by participant
+into --bucket-rows sized temporary files, so memory depends on the bucket
+size and not on the size of the table.
+
+Logged win_streak/loss_streak are the values after the trial's outcome. The
+state a choice was made in is taken from the previous trial of the same
+block: streak is +n after n wins, -n after n losses (capped at
+--streak-cap), 0 at the start of a block. The bias window opens when a
+risky outcome brings a streak to exactly 3 and closes after 3 further risky
+draws; a window can never already be open at that point, because the 3
+risky draws a new streak needs also close the old window. Rows from the
+first missing trial of a block onwards cannot be placed and are skipped.
+Each risky row's p_win is recomputed from the rebuilt state and compared to
+the logged one as a check.
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+import game
+
+SCHEMA = pa.schema([
+    ("participant_id", pa.string()),
+    ("condition", pa.string()),
+    ("block", pa.int16()),
+    ("round", pa.int16()),
+    ("choice", pa.string()),
+    ("outcome", pa.string()),
+    ("p_win", pa.float64()),
+    ("win_streak", pa.int16()),
+    ("loss_streak", pa.int16()),
+    ("reaction_time_ms", pa.float64()),
+    ("client_reaction_time_ms", pa.float64()),
+])
+
+CONDITION = SCHEMA.get_field_index("condition")
+
+RT_COLUMNS = {"server": "reaction_time_ms", "client": "client_reaction_time_ms"}
+
+# Log-spaced RT bins from 1 ms to 10 min (about 6% wide); quantiles interpolate inside a bin
+RT_EDGES_MS = np.geomspace(1, 600_000, 241)
+RT_QUANTILES = (0.5, 0.9, 0.99)
+
+GROUP_KEYS = ["participant_id", "condition", "streak", "bias_window"]
+
+
+# ===== INPUT =====
+def open_dataset(path):
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        return ds.dataset(path, format="parquet", partitioning="hive")
+    if path.endswith(".csv"):
+        return ds.dataset(path, format="csv")
+    raise ValueError(f"expected a Parquet file/directory or a CSV: {path}")
+
+
+def iter_batches(dataset, batch_rows):
+    """Record batches with SCHEMA's columns (columns missing from older exports come back null)"""
+    present = [name for name in SCHEMA.names if name in dataset.schema.names]
+    # One file at a time: the dataset-wide scanner reads ahead several files
+    # whenever the consumer is slower than the disk
+    for fragment in dataset.get_fragments():
+        for batch in fragment.to_batches(columns=present, batch_size=batch_rows):
+            columns = []
+            for field in SCHEMA:
+                if field.name in present:
+                    columns.append(batch.column(field.name).cast(field.type))
+                else:
+                    columns.append(pa.nulls(batch.num_rows, field.type))
+            columns[CONDITION] = columns[CONDITION].fill_null("unknown")
+            yield pa.RecordBatch.from_arrays(columns, schema=SCHEMA)
+
+
+def iter_buckets(dataset, n_buckets, tmp_dir, batch_rows):
+    """
+    Yield the trials as DataFrames in which every participant is complete.
+    With more than one bucket, rows are first spilled to one Arrow stream file
+    per hash(participant_id) % n_buckets.
+    """
+    if n_buckets == 1:
+        yield _to_pandas(pa.Table.from_batches(iter_batches(dataset, batch_rows), schema=SCHEMA))
+        return
+
+    paths = [os.path.join(tmp_dir, f"bucket-{i}.arrow") for i in range(n_buckets)]
+    writers = [None] * n_buckets
+    # pyarrow builds without the LZ4 codec spill uncompressed instead of failing
+    options = ipc.IpcWriteOptions(compression="lz4" if pa.Codec.is_available("lz4") else None)
+    try:
+        for batch in iter_batches(dataset, batch_rows):
+            # A batch holds few distinct participants: hash those, not every row
+            ids = batch.column("participant_id").fill_null("").dictionary_encode()
+            buckets = (pd.util.hash_array(ids.dictionary.to_numpy(zero_copy_only=False)) % n_buckets)[
+                ids.indices.to_numpy()]
+            order = np.argsort(buckets, kind="stable")
+            bounds = np.searchsorted(buckets[order], np.arange(n_buckets + 1))
+            batch = batch.take(pa.array(order))
+            for i in range(n_buckets):
+                if bounds[i] == bounds[i + 1]:
+                    continue
+                if writers[i] is None:
+                    writers[i] = ipc.new_stream(paths[i], SCHEMA, options=options)
+                writers[i].write_batch(batch.slice(bounds[i], bounds[i + 1] - bounds[i]))
+    finally:
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+
+    for path, writer in zip(paths, writers):
+        if writer is None:
+            continue
+        with ipc.open_stream(path) as reader:
+            df = _to_pandas(reader.read_all())
+        os.remove(path)
+        yield df
+
+
+def _to_pandas(table):
+    # Categoricals: a bucket holds millions of rows but few distinct strings
+    return table.to_pandas(strings_to_categorical=True)
+
+
+# ===== PRE-CHOICE STATE =====
+def pre_choice_state(df, streak_cap):
+    """
+    df sorted by (participant_id, block, round), duplicates removed.
+    Adds streak, bias_left, bias_window and usable (see the module docstring).
+    """
+    n = len(df)
+    pid = df["participant_id"]
+    pid = pid.cat.codes.to_numpy() if isinstance(pid.dtype, pd.CategoricalDtype) else pid.to_numpy()
+    block = df["block"].to_numpy()
+    rnd = df["round"].to_numpy().astype(np.int32)
+    win_streak = df["win_streak"].fillna(0).to_numpy().astype(np.int32)
+    loss_streak = df["loss_streak"].fillna(0).to_numpy().astype(np.int32)
+    risky = (df["choice"] == "risk").to_numpy()
+    win = (df["outcome"] == "win").to_numpy()
+    loss = (df["outcome"] == "loss").to_numpy()
+
+    # First row of each (participant, block), and that row's index for every row
+    start = np.ones(n, dtype=bool)
+    start[1:] = (pid[1:] != pid[:-1]) | (block[1:] != block[:-1])
+    group_first = np.flatnonzero(start)[np.cumsum(start) - 1]
+
+    def previous(values, fill):
+        out = np.empty_like(values)
+        out[1:] = values[:-1]
+        out[start] = fill
+        return out
+
+    def group_cumsum(values):
+        total = np.cumsum(values)
+        return total - (total - values)[group_first]
+
+    gap = np.where(start, rnd != 0, rnd != previous(rnd, -1) + 1)
+    usable = group_cumsum(gap.astype(np.int32)) == 0
+
+    streak = previous(win_streak, 0) - previous(loss_streak, 0)
+
+    trigger = risky & (
+        (win & (win_streak == game.STREAK_TRIGGER))
+        | (loss & (loss_streak == game.STREAK_TRIGGER))
+    )
+    draws = group_cumsum(risky.astype(np.int32))  # risky draws up to and including this row
+    last_trigger = previous(np.maximum.accumulate(np.where(trigger, np.arange(n), -1)), -1)
+    opened = last_trigger >= group_first
+    since = draws - risky - draws[np.maximum(last_trigger, 0)]
+    bias_left = np.where(opened, np.clip(game.BIAS_WINDOW - since, 0, None), 0)
+
+    df["streak"] = np.clip(streak, -streak_cap, streak_cap).astype(np.int16)
+    df["bias_left"] = bias_left.astype(np.int16)
+    df["bias_window"] = bias_left > 0
+    df["usable"] = usable
+    df["_raw_streak"] = streak
+    return df
+
+
+def expected_p_win(df):
+    """game.risk_p_win() over the rebuilt pre-choice state"""
+    p = np.full(len(df), 0.5)
+    left = df["bias_left"].to_numpy()
+    streak = df["_raw_streak"].to_numpy()
+    window = left > 0
+    for rounds_left in range(1, game.BIAS_WINDOW + 1):
+        at = window & (left == rounds_left)
+        p[at & (streak >= game.STREAK_TRIGGER)] = game.WIN_STREAK_P[rounds_left]
+        p[at & (streak <= -game.STREAK_TRIGGER)] = game.LOSS_STREAK_P[rounds_left]
+    return p
+
+
+# ===== AGGREGATION =====
+class Accumulator:
+    """Additive counts per condition, merged across buckets"""
+
+    def __init__(self):
+        self.counts = None
+        self.rt_bins = {}       # (source, condition) -> counts per RT_EDGES_MS bin
+        self.rt_moments = {}    # (source, condition) -> [count, sum, sum of squares]
+        self.rows = self.duplicates = self.skipped = self.participants = 0
+        self.p_win_checked = self.p_win_mismatches = 0
+
+    def add_counts(self, table):
+        by_condition = table.groupby(["condition", "streak", "bias_window"], observed=True)[["trials", "risky"]].sum()
+        self.counts = by_condition if self.counts is None else self.counts.add(by_condition, fill_value=0)
+
+    def add_rt(self, df):
+        codes, conditions = pd.factorize(df["condition"])
+        n_bins = len(RT_EDGES_MS) + 1
+        for source, column in RT_COLUMNS.items():
+            rt = df[column].to_numpy(dtype=float)
+            ok = ~np.isnan(rt) & (codes >= 0)
+            rt, c = rt[ok], codes[ok]
+            bins = np.bincount(c * n_bins + np.searchsorted(RT_EDGES_MS, rt), minlength=len(conditions) * n_bins)
+            count = np.bincount(c, minlength=len(conditions))
+            total = np.bincount(c, weights=rt, minlength=len(conditions))
+            squares = np.bincount(c, weights=rt * rt, minlength=len(conditions))
+            for i, condition in enumerate(conditions):
+                if not count[i]:
+                    continue
+                key = (source, condition)
+                hist = bins[i * n_bins:(i + 1) * n_bins]
+                self.rt_bins[key] = self.rt_bins.get(key, 0) + hist
+                moments = self.rt_moments.setdefault(key, [0, 0.0, 0.0])
+                moments[0] += int(count[i])
+                moments[1] += float(total[i])
+                moments[2] += float(squares[i])
+
+    def summary(self):
+        counts = self.counts if self.counts is not None else pd.DataFrame(
+            columns=["trials", "risky"], index=pd.MultiIndex.from_tuples([], names=["condition", "streak", "bias_window"]))
+        by_streak, by_window = {}, {}
+        for (condition, streak), row in counts.groupby(level=["condition", "streak"]).sum().iterrows():
+            by_streak.setdefault(condition, {})[_streak_label(streak)] = _rate(row)
+        for (condition, window), row in counts.groupby(level=["condition", "bias_window"]).sum().iterrows():
+            by_window.setdefault(condition, {})["inside" if window else "outside"] = _rate(row)
+
+        rt = {}
+        for (source, condition), (count, total, squares) in sorted(self.rt_moments.items()):
+            mean = total / count
+            entry = {"count": count, "mean_ms": round(mean, 1),
+                     "sd_ms": round(math.sqrt(max(squares / count - mean * mean, 0.0)), 1)}
+            for q in RT_QUANTILES:
+                entry[f"p{int(q * 100)}_ms"] = _hist_quantile(self.rt_bins[(source, condition)], q)
+            rt.setdefault(condition, {})[source] = entry
+
+        return {
+            "rows": self.rows,
+            "participants": self.participants,
+            "duplicates_dropped": self.duplicates,
+            "rows_after_gap": self.skipped,
+            "p_win_check": {"risky_rows": self.p_win_checked, "mismatches": self.p_win_mismatches},
+            "risk_rate_by_streak": by_streak,
+            "risk_rate_by_bias_window": by_window,
+            "reaction_time": rt,
+        }
+
+
+def _streak_label(streak):
+    return f"+{streak}" if streak > 0 else str(streak)
+
+
+def _rate(row):
+    trials, risky = int(row["trials"]), int(row["risky"])
+    return {"trials": trials, "risky": risky, "risk_rate": round(risky / trials, 4) if trials else None}
+
+
+def _hist_quantile(counts, q):
+    total = counts.sum()
+    if not total:
+        return None
+    rank = q * total
+    cumulative = np.cumsum(counts)
+    i = int(np.searchsorted(cumulative, rank))
+    lower = RT_EDGES_MS[i - 1] if i > 0 else 0.0
+    upper = RT_EDGES_MS[min(i, len(RT_EDGES_MS) - 1)]
+    before = cumulative[i - 1] if i > 0 else 0
+    return round(float(lower + (upper - lower) * (rank - before) / counts[i]), 1)
+
+
+def analyze_bucket(df, acc, streak_cap):
+    """Adds one bucket to acc; returns its per-participant table"""
+    acc.rows += len(df)
+    size = len(df)
+    df = df.drop_duplicates(["participant_id", "block", "round"])
+    acc.duplicates += size - len(df)
+    df = df.sort_values(["participant_id", "block", "round"], kind="stable").reset_index(drop=True)
+    df = pre_choice_state(df, streak_cap)
+
+    acc.skipped += int((~df["usable"]).sum())
+    df = df[df["usable"]]
+    acc.participants += df["participant_id"].nunique()
+
+    risky = (df["choice"] == "risk").to_numpy()
+    logged = df["p_win"].to_numpy(dtype=float)[risky]
+    acc.p_win_checked += int(risky.sum())
+    acc.p_win_mismatches += int((np.abs(logged - expected_p_win(df)[risky]) > 1e-9).sum())
+
+    rt = df["reaction_time_ms"]
+    table = pd.DataFrame({
+        "participant_id": df["participant_id"],
+        "condition": df["condition"],
+        "streak": df["streak"],
+        "bias_window": df["bias_window"],
+        "trials": 1,
+        "risky": risky.astype(np.int64),
+        "rt_count": rt.notna().astype(np.int64),
+        "rt_sum_ms": rt.fillna(0.0),
+    }).groupby(GROUP_KEYS, sort=True, observed=True).sum().reset_index()
+
+    acc.add_counts(table)
+    acc.add_rt(df)
+    return table
+
+
+def analyze(path, participants_path=None, bucket_rows=2_000_000, batch_rows=131_072, streak_cap=6, tmp_dir=None):
+    """
+    Returns the summary dict. If participants_path is given, also writes one
+    row per (participant_id, condition, streak, bias_window) with trial,
+    risky-choice and reaction-time sums there.
+    """
+    dataset = open_dataset(path)
+    n_buckets = max(1, math.ceil(dataset.count_rows() / bucket_rows))
+    acc = Accumulator()
+    writer = None
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        try:
+            for df in iter_buckets(dataset, n_buckets, tmp, batch_rows):
+                table = analyze_bucket(df, acc, streak_cap)
+                if participants_path:
+                    out = pa.Table.from_pandas(table, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(participants_path, out.schema, compression="zstd")
+                    writer.write_table(out)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    summary = acc.summary()
+    summary["buckets"] = n_buckets
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Parquet file/directory or CSV export of experiment_data")
+    parser.add_argument("--out", default=None, help="write the summary JSON here as well as to stdout")
+    parser.add_argument("--participants", default=None, help="write per-participant counts to this Parquet file")
+    parser.add_argument("--bucket-rows", type=int, default=2_000_000, help="rows held in memory at once")
+    parser.add_argument("--batch-rows", type=int, default=131_072, help="rows per read batch")
+    parser.add_argument("--streak-cap", type=int, default=6, help="longer streaks are counted as this length")
+    parser.add_argument("--tmp-dir", default=None, help="where the bucket files go (default: system temp)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = analyze(args.path, args.participants, args.bucket_rows, args.batch_rows, args.streak_cap, args.tmp_dir)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+
+    text = json.dumps(summary, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+from functools import lru_cache
+
+# HTML for the balance animation and the streak banners.
+#
+# Each piece of markup depends only on a handful of small inputs (condition,
+# outcome type, streak lengths, whether feedback is showing), so it is built
+# from a template once per distinct input per process and then reused from a
+# bounded LRU cache on every later rerun, for every participant.
+
+# ===== TEMPLATES =====
+BALANCE_CHANGE_TEMPLATE = '<span class="{anim_class} {color_class}">{emoji}{text}</span>'
+
+BALANCE_METRIC_TEMPLATE = (
+    "<div style='font-size: 14px; color: {label_color}; margin-bottom: 4px;'>Balance</div>"
+    "<div style='font-size: 28px; font-weight: 700;'>${balance} {animation}</div>"
+)
+
+VISUAL_BANNER_TEMPLATE = """
+    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                color: white;
+                padding: 20px;
+                border-radius: 16px;
+                margin-bottom: 24px;
+                box-shadow: 0 4px 16px rgba(102, 126, 234, 0.3);">
+        <div style="font-size: 18px; font-weight: 600; margin-bottom: 12px;">Current Streaks</div>
+        <div style="display: flex; gap: 12px; justify-content: center;">
+            <span class="streak-display win-streak"> Win Streak: {win_streak}</span>
+            <span class="streak-display loss-streak"> Loss Streak: {loss_streak}</span>
+        </div>
+    </div>
+    """
+
+AFFECTIVE_BANNER_TEMPLATE = """
+    <div style="background: linear-gradient(135deg, {color} 0%, {gradient_end} 100%); padding: 24px; border-radius: 16px; border: 3px solid {border_color}; margin-bottom: 20px; box-shadow: 0 4px 16px rgba(0,0,0,0.08);" class="{banner_animation}">
+        <div style="font-size: 24px; font-weight: 700; margin-bottom: 8px;">{message}</div>
+        <div style="font-size: 14px; opacity: 0.85; margin-bottom: 16px;">{subtext}</div>
+    </div>
+
+    <div style="display: flex; gap: 16px; margin-bottom: 20px; justify-content: center;">
+        <div style="background: white; padding: 16px 24px; border-radius: 16px; font-weight: 700; display: flex; align-items: center; gap: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); flex: 1; max-width: 200px; transition: all 0.3s ease;">
+            <span class="{win_animation}" style="font-size: {win_size}px; display: inline-block; transition: font-size 0.3s ease;">🔥</span>
+            <div style="text-align: left;">
+                <div style="font-size: 11px; opacity: 0.6; text-transform: uppercase; letter-spacing: 0.5px;">Win Streak</div>
+                <div style="font-size: 32px; color: #0b6623; line-height: 1;">{win_streak}</div>
+            </div>
+        </div>
+        <div style="background: white; padding: 16px 24px; border-radius: 16px; font-weight: 700; display: flex; align-items: center; gap: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); flex: 1; max-width: 200px; transition: all 0.3s ease;">
+            <span class="{loss_animation}" style="font-size: {loss_size}px; display: inline-block; transition: font-size 0.3s ease;">💔</span>
+            <div style="text-align: left;">
+                <div style="font-size: 11px; opacity: 0.6; text-transform: uppercase; letter-spacing: 0.5px;">Loss Streak</div>
+                <div style="font-size: 32px; color: #8b0000; line-height: 1;">{loss_streak}</div>
+            </div>
+        </div>
+    </div>
+
+    <div style="text-align: center; font-size: 13px; opacity: 0.7; font-style: italic;">Momentum like this doesn't last forever.</div>
+    """
+
+# Amount and animation type for each feedback outcome
+BALANCE_CHANGES = {
+    "safe": (1, "safe"),
+    "win": (4, "win"),
+    "loss": (-2, "loss"),
+}
+
+# Affective banner styling per tone: (border_color, gradient_end, banner_animation)
+TONE_STYLES = {
+    "hot": ("#0b6623", "#fff9e6", "pulse glow-pulse"),
+    "cold": ("#8b0000", "#ffe6e6", "pulse glow-pulse"),
+    "neutral": ("#444444", "#f5f5f5", ""),
+}
+
+
+def emotional_context(win_streak, loss_streak):
+    if win_streak >= 3:
+        return {
+            "tone": "hot",
+            "color": "#fff3cd",
+            "message": "🔥 You’re on fire!",
+            "sub": "Most players press their advantage here."
+        }
+    elif loss_streak >= 3:
+        return {
+            "tone": "cold",
+            "color": "#f8d7da",
+            "message": "😬 Rough stretch...",
+            "sub": "Many players try to recover losses now."
+        }
+    else:
+        return {
+            "tone": "neutral",
+            "color": "#e2e3e5",
+            "message": "🤔 Momentum is building",
+            "sub": "What will you do next?"
+        }
+
+
+@lru_cache(maxsize=64)
+def show_balance_change_animation(amount, condition, outcome_type):
+    """
+    Display animated balance change based on condition
+    amount: +1, +4, or -2
+    condition: "neutral", "visual", "affective", "de-salience"
+    outcome_type: "safe", "win", "loss"
+    """
+
+    # Format the display text
+    if amount > 0:
+        display_text = f"+${amount}"
+    else:
+        display_text = f"-${abs(amount)}"
+
+    # Determine animation class and color
+    if condition == "neutral":
+        anim_class = "balance-change-neutral"
+        color_class = ""
+        emoji = ""
+
+    elif condition == "visual":
+        anim_class = "balance-change-visual"
+        if outcome_type == "safe":
+            color_class = "color-safe"
+        elif outcome_type == "win":
+            color_class = "color-win"
+        else:
+            color_class = "color-loss"
+        emoji = ""
+
+    elif condition == "affective":
+        if outcome_type == "win" or outcome_type == "safe":
+            anim_class = "balance-change-affective-win"
+            color_class = "color-affective-win"
+            emoji = "💰 " if outcome_type == "win" else "✓ "
+        else:
+            anim_class = "balance-change-affective-loss"
+            color_class = "color-affective-loss"
+            emoji = "💔 "
+
+    else:  # de-salience
+        anim_class = "balance-change-desalience"
+        color_class = ""
+        emoji = ""
+
+    return BALANCE_CHANGE_TEMPLATE.format(
+        anim_class=anim_class, color_class=color_class, emoji=emoji, text=display_text
+    )
+
+
+@lru_cache(maxsize=4096)
+def balance_metric_html(balance, condition, last_outcome):
+    """Balance label, value and the animated change for the outcome just shown"""
+    amount, outcome_type = BALANCE_CHANGES.get(last_outcome, BALANCE_CHANGES["loss"])
+    return BALANCE_METRIC_TEMPLATE.format(
+        label_color="#665" if condition == "visual" else "#666",
+        balance=balance,
+        animation=show_balance_change_animation(amount, condition, outcome_type),
+    )
+
+
+@lru_cache(maxsize=512)
+def visual_banner_html(win_streak, loss_streak):
+    return VISUAL_BANNER_TEMPLATE.format(win_streak=win_streak, loss_streak=loss_streak)
+
+
+@lru_cache(maxsize=1024)
+def affective_banner_html(win_streak, loss_streak, awaiting_feedback, last_outcome):
+    ctx = emotional_context(win_streak, loss_streak)
+    border_color, gradient_end, banner_animation = TONE_STYLES[ctx["tone"]]
+
+    if ctx["tone"] == "hot":
+        subtext = f"You're on fire! {win_streak} wins in a row! 🔥"
+    elif ctx["tone"] == "cold":
+        subtext = f"Hang in there… {loss_streak} losses in a row 💔"
+    else:
+        subtext = "Steady as she goes. Keep your focus."
+
+    # Burst animation only right after an outcome; otherwise bounce while a streak is active
+    win_burst = awaiting_feedback and last_outcome == "win"
+    loss_burst = awaiting_feedback and last_outcome == "loss"
+    win_animation = "streak-burst" if win_burst else ("bounce" if win_streak >= 3 else "")
+    loss_animation = "streak-burst" if loss_burst else ("bounce" if loss_streak >= 3 else "")
+
+    return AFFECTIVE_BANNER_TEMPLATE.format(
+        color=ctx["color"],
+        gradient_end=gradient_end,
+        border_color=border_color,
+        banner_animation=banner_animation,
+        message=ctx["message"],
+        subtext=subtext,
+        win_animation=win_animation,
+        loss_animation=loss_animation,
+        # Progressive emoji sizing: grows 3px per streak
+        win_size=22 + win_streak * 3,
+        loss_size=22 + loss_streak * 3,
+        win_streak=win_streak,
+        loss_streak=loss_streak,
+    )
+
+
+def cache_stats():
+    """Hit/miss counters for every cached template"""
+    stats = {}
+    for fn in (show_balance_change_animation, balance_metric_html, visual_banner_html, affective_banner_html):
+        info = fn.cache_info()
+        stats[fn.__name__] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+        }
+    return stats
@@ -0,0 +1,118 @@
+"""
+Rerun latency of admitted participants with and without an admission cap.
+
+Simulates a recruitment burst in one process: --participants arrive within
+--arrival-s seconds, each on its own thread as Streamlit runs each session's
+script. A participant asks admission.AdmissionController for a slot, polls
+every --poll-s seconds until it gets one, then plays --trials trials: a think
+time, then two reruns (choice, Continue) of --rerun-cpu-ms of pure-Python
+work each, and finally releases the slot. The default rerun cost is what
+bench/loadtest.py measured per AppTest rerun of app.py (about 6 ms CPU).
+
+Reports, per --limits value (0 = no cap): rerun wall time percentiles
+(what inflates reaction_time_ms), time spent waiting for a slot, peak
+active sessions and total time for everyone to finish.
+
+    python bench/admission_burst.py --participants 200 --limits 0 20 --out admission.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController  # noqa: E402
+from loadtest import _summary  # noqa: E402
+
+
+def _burn(ms):
+    """Hold the GIL for about ms of CPU, like a script rerun"""
+    end = time.thread_time() + ms / 1000
+    n = 0
+    while time.thread_time() < end:
+        for _ in range(1000):
+            n += 1
+    return n
+
+
+def run(limit, args):
+    controller = AdmissionController(limit, expected_session_s=args.trials * (args.think_s + 0.02))
+    lock = threading.Lock()
+    reruns, waits, peak = [], [], [0]
+
+    def participant(pid, delay):
+        rng = random.Random(pid)
+        time.sleep(delay)
+        queued = time.perf_counter()
+        while not controller.try_admit(pid):
+            time.sleep(args.poll_s)
+        wait = time.perf_counter() - queued
+        with lock:
+            waits.append(wait)
+            peak[0] = max(peak[0], controller.stats()["active"])
+
+        mine = []
+        for _ in range(args.trials):
+            time.sleep(rng.expovariate(1 / args.think_s))
+            for _ in range(2):
+                start = time.perf_counter()
+                _burn(args.rerun_cpu_ms)
+                mine.append((time.perf_counter() - start) * 1000)
+            controller.heartbeat(pid)
+        controller.release(pid)
+        with lock:
+            reruns.extend(mine)
+
+    rng = random.Random(args.seed)
+    threads = [
+        threading.Thread(target=participant, args=(i, rng.uniform(0, args.arrival_s)), daemon=True)
+        for i in range(args.participants)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    stats = controller.stats()
+    return {
+        "rerun_ms": _summary(reruns),
+        "wait_s": _summary(waits),
+        "peak_active": peak[0],
+        "max_queue_length": stats["max_queue_length"],
+        "seconds_to_finish_all": round(elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=200)
+    parser.add_argument("--limits", type=int, nargs="+", default=[0, 20])
+    parser.add_argument("--arrival-s", type=float, default=5.0, help="all participants arrive within this window")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--think-s", type=float, default=0.5, help="mean time between trials")
+    parser.add_argument("--rerun-cpu-ms", type=float, default=6.0)
+    parser.add_argument("--poll-s", type=float, default=0.25, help="waiting room poll interval")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    report = {"config": vars(args), "runs": {}}
+    for limit in args.limits:
+        report["runs"][limit] = run(limit, args)
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Per-rerun server CPU time for each block condition.
+
+Pins every block of a simulated participant to one condition, plays a
+number of trials with AppTest and records the CPU time (process_time) of
+each choice and Continue rerun.
+
+    python bench/condition_cpu.py --trials 30 --out after.json
+    python bench/condition_cpu.py --app /path/to/older/checkout/app.py --out before.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import APP_PATH, install_stub, _button, _summary  # noqa: E402
+
+CONDITIONS = ["neutral", "visual", "affective", "de-salience"]
+
+
+def share_script_cache():
+    """
+    AppTest compiles the script from scratch on every run; the real server
+    keeps the bytecode in one ScriptCache. Share one here too, so compile
+    time (which grows with the size of app.py) is not billed to each rerun.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+
+    shared = ScriptCache()
+    local_script_runner.ScriptCache = lambda: shared
+
+
+def measure(app_path, condition, trials, seed=0):
+    import random
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(app_path, default_timeout=60)
+    at.secrets["supabase"] = {"url": "http://stub", "key": "stub"}
+    # Pre-seed the assignment so every block uses this condition
+    try:
+        from session import SESSION_KEY, Session
+        at.session_state[SESSION_KEY] = Session(block_order=[condition] * 4)
+    except ImportError:  # checkouts from before session.py
+        at.session_state["block_order"] = [condition] * 4
+        at.session_state["order_name"] = f"bench-{condition}"
+    at.run()
+    _button(at, "Start Experiment").click().run()
+
+    cpu_ms = []
+
+    def timed(widget):
+        start = time.process_time()
+        widget.click().run()
+        cpu_ms.append((time.process_time() - start) * 1000)
+
+    for _ in range(trials):
+        timed(rng.choice([b for b in at.button if not b.disabled][:2]))
+        timed(_button(at, "Continue →"))
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=APP_PATH)
+    parser.add_argument("--trials", type=int, default=29, help="at most 29 to stay inside one block")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--recompile", action="store_true", help="include per-run script compilation (AppTest default)")
+    args = parser.parse_args()
+
+    os.environ["ISM_CLIENT_RT"] = "0"
+    args.app = os.path.abspath(args.app)
+    app_dir = os.path.dirname(args.app)
+    sys.path.insert(0, app_dir)
+    install_stub(0)
+    if not args.recompile:
+        share_script_cache()
+
+    # Warm-up run so imports and first-time caches are not billed to one condition
+    measure(args.app, "neutral", 2)
+
+    report = {"app": args.app, "trials": args.trials, "recompile": args.recompile, "cpu_ms_per_rerun": {}}
+    for condition in CONDITIONS:
+        report["cpu_ms_per_rerun"][condition] = _summary(measure(args.app, condition, args.trials))
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
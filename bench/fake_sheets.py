@@ -0,0 +1,144 @@
+"""
+In-process fake of the Google Sheets v4 REST API for gspread.
+
+Mounted as a requests transport adapter on the session a gspread.Client
+uses, so gspread's own request building, response parsing and APIError
+handling run unchanged. Implements what the sheets sink touches: spreadsheet
+metadata, reading a range and values:append. Like the real API, each request
+counts against a per-minute quota (reads and writes separately) and
+requests over it get 429 RESOURCE_EXHAUSTED.
+
+    api = FakeSheetsAPI(quota=60, latency=0.15)
+    worksheet = fake_client(api).open_by_key(FAKE_KEY).worksheet("trials")
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+BASE_URL = "https://sheets.googleapis.com/"
+FAKE_KEY = "fake-spreadsheet"
+
+_VALUES = re.compile(r"^/v4/spreadsheets/([^/]+)/values/(.+?)(:append)?$")
+_SPREADSHEET = re.compile(r"^/v4/spreadsheets/([^/:]+)$")
+
+
+class FakeSheetsAPI(BaseAdapter):
+    """
+    quota: requests per window (seconds) for reads and for writes
+    latency: seconds each request takes
+    error_rate: fraction of writes answered with 503
+    """
+
+    def __init__(self, quota=60, window=60.0, latency=0.1, error_rate=0.0, title="trials", seed=0):
+        super().__init__()
+        self.quota = quota
+        self.window = window
+        self.latency = latency
+        self.error_rate = error_rate
+        self.title = title
+        self.values = []            # every appended row, in order
+        self.counts = Counter()     # reads, writes, throttled, server_errors
+        self._recent = {"read": deque(), "write": deque()}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        time.sleep(self.latency)
+        path = unquote(urlsplit(request.url).path)
+        kind = "write" if request.method == "POST" else "read"
+
+        with self._lock:
+            self.counts[f"{kind}s"] += 1
+            if not self._take_quota(kind):
+                self.counts["throttled"] += 1
+                return _response(request, 429, _error(429, "RESOURCE_EXHAUSTED",
+                                                      f"Quota exceeded for quota metric '{kind.title()} requests'"))
+            if kind == "write" and self._random.random() < self.error_rate:
+                self.counts["server_errors"] += 1
+                return _response(request, 503, _error(503, "UNAVAILABLE", "The service is currently unavailable."))
+
+            match = _SPREADSHEET.match(path)
+            if match and kind == "read":
+                return _response(request, 200, self._metadata(match.group(1)))
+
+            match = _VALUES.match(path)
+            if match and match.group(3) and kind == "write":
+                rows = json.loads(request.body)["values"]
+                first = len(self.values) + 1
+                self.values.extend(rows)
+                return _response(request, 200, {
+                    "spreadsheetId": match.group(1),
+                    "updates": {
+                        "updatedRange": f"{self.title}!A{first}:{first + len(rows) - 1}",
+                        "updatedRows": len(rows),
+                    },
+                })
+            if match and kind == "read":
+                return _response(request, 200, self._read(match.group(2)))
+
+        return _response(request, 404, _error(404, "NOT_FOUND", f"No fake for {request.method} {path}"))
+
+    def close(self):
+        pass
+
+    def _take_quota(self, kind):
+        recent = self._recent[kind]
+        now = time.monotonic()
+        while recent and recent[0] <= now - self.window:
+            recent.popleft()
+        if len(recent) >= self.quota:
+            return False
+        recent.append(now)
+        return True
+
+    def _metadata(self, key):
+        return {
+            "spreadsheetId": key,
+            "properties": {"title": "ISM trials (fake)", "locale": "en_US", "timeZone": "Etc/UTC"},
+            "sheets": [{"properties": {
+                "sheetId": 0, "title": self.title, "index": 0, "sheetType": "GRID",
+                "gridProperties": {"rowCount": max(1000, len(self.values)), "columnCount": 26},
+            }}],
+        }
+
+    def _read(self, a1_range):
+        """Rows of 'title'!A<n>:<m>; enough for row_values() / get_values()"""
+        rows = re.findall(r"(\d+)", a1_range.split("!")[-1])
+        start = int(rows[0]) if rows else 1
+        end = int(rows[1]) if len(rows) > 1 else (start if rows else len(self.values))
+        body = {"range": a1_range, "majorDimension": "ROWS"}
+        values = self.values[start - 1:end]
+        if values:
+            body["values"] = values
+        return body
+
+
+def _error(code, status, message):
+    return {"error": {"code": code, "message": message, "status": status}}
+
+
+def _response(request, status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    response.headers["Content-Type"] = "application/json; charset=UTF-8"
+    response.encoding = "utf-8"
+    response.url = request.url
+    response.request = request
+    return response
+
+
+def fake_client(api):
+    """A gspread.Client whose requests all go to api"""
+    import gspread
+
+    session = requests.Session()
+    session.mount(BASE_URL, api)
+    return gspread.Client(None, session=session)
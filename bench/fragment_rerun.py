@@ -0,0 +1,201 @@
+"""
+Server CPU and bytes sent per trial click, full-page vs fragment reruns.
+
+"full" mode measures the app as it is: each choice/Continue click reruns
+the whole script. The other modes replace conditions.render_trial before
+the first run and send every click the way the browser does for a widget
+inside a fragment: as a rerun request carrying the fragment id, so the
+server runs only the fragment. (AppTest on its own always reruns the whole
+script.)
+
+  fragment  the whole trial screen in one st.fragment
+  split     the requested split: the balance metric, choice buttons,
+            feedback and Continue in one fragment; the Block/Round metrics,
+            the condition banner and captions outside it, redrawn only by
+            full reruns (block boundaries). One fragment has to hold both
+            the balance and the buttons, so the balance moves out of the
+            top metrics row to just above the buttons.
+
+In split mode the Round counter and the streak banner outside the fragment
+keep showing the values of the last full rerun, so it is measured here but
+not used by the app. Trials stay inside one block, so the block-boundary
+full rerun is not exercised.
+
+Bytes are the serialized ForwardMsgs the server produced for the run, i.e.
+what goes over the websocket.
+
+    python bench/fragment_rerun.py --trials 29 --out full.json
+    python bench/fragment_rerun.py --mode fragment --out fragment.json
+    python bench/fragment_rerun.py --mode split --out split.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import APP_PATH, install_stub, _button, _summary  # noqa: E402
+from condition_cpu import CONDITIONS, share_script_cache  # noqa: E402
+
+_state = {"fragment_id": None, "runner": None}
+
+
+def patch_runner():
+    """Let AppTest send fragment-scoped reruns and keep the last runner for its messages"""
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+    from streamlit.testing.v1 import local_script_runner
+
+    def rerun_data(**kwargs):
+        return RerunData(fragment_id=_state["fragment_id"], **kwargs)
+
+    local_script_runner.RerunData = rerun_data
+
+    original_run = local_script_runner.LocalScriptRunner.run
+
+    def run(self, *args, **kwargs):
+        _state["runner"] = self
+        return original_run(self, *args, **kwargs)
+
+    local_script_runner.LocalScriptRunner.run = run
+
+
+def wrap_trial_in_fragment():
+    import streamlit as st
+    import conditions
+
+    conditions.render_trial = st.fragment(conditions.render_trial)
+
+
+def split_trial_into_fragment():
+    import streamlit as st
+    import conditions
+    from banners import emotional_context
+    from session import get_session
+
+    def tone_of(s, cond):
+        return emotional_context(s.win_streak, s.loss_streak)["tone"] if cond.uses_tone else None
+
+    @st.fragment
+    def interaction():
+        s = get_session()
+        if s.in_break:
+            st.rerun()  # block boundary: the whole page changes
+        cond = conditions.CONDITIONS[s.condition]
+        conditions._balance_metric(s, cond.name)
+        conditions._choice_area(s, cond, tone_of(s, cond))
+
+    def render_trial():
+        s = get_session()
+        cond = conditions.CONDITIONS[s.condition]
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Block", s.block)
+        with col2:
+            st.metric("Round", f"{s.round + 1}/{conditions.ROUNDS_PER_BLOCK}")
+        st.divider()
+        if cond.banner is not None:
+            awaiting = s.awaiting_feedback
+            st.markdown(cond.banner(s.win_streak, s.loss_streak, awaiting, s.last_outcome if awaiting else None),
+                        unsafe_allow_html=True)
+        if cond.caption_above:
+            st.caption(cond.caption_above)
+        interaction()
+
+    conditions.render_trial = render_trial
+
+
+def sent_bytes():
+    from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+
+    runner = _state["runner"]
+    return sum(
+        data["forward_msg"].ByteSize()
+        for event, data in zip(runner.events, runner.event_data)
+        if event == ScriptRunnerEvent.ENQUEUE_FORWARD_MSG
+    )
+
+
+def trial_fragment_id(at):
+    fragments = list(at._fragment_storage._fragments)
+    if len(fragments) != 1:
+        raise RuntimeError(f"expected one fragment on the trial screen, found {len(fragments)}")
+    return fragments[0]
+
+
+def measure(app_path, condition, trials, mode, seed=0):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(app_path, default_timeout=60)
+    at.secrets["supabase"] = {"url": "http://stub", "key": "stub"}
+    try:
+        from session import SESSION_KEY, Session
+        at.session_state[SESSION_KEY] = Session(block_order=[condition] * 4)
+    except ImportError:  # checkouts from before session.py
+        at.session_state["block_order"] = [condition] * 4
+        at.session_state["order_name"] = f"bench-{condition}"
+    at.run()
+    _button(at, "Start Experiment").click().run()
+
+    cpu_ms, nbytes = [], []
+    fragment_id = trial_fragment_id(at) if mode != "full" else None
+
+    def click(widget):
+        _state["fragment_id"] = fragment_id
+        start = time.process_time()
+        try:
+            widget.click().run()
+        finally:
+            _state["fragment_id"] = None
+        cpu_ms.append((time.process_time() - start) * 1000)
+        nbytes.append(sent_bytes())
+
+    for _ in range(trials):
+        click(rng.choice([b for b in at.button if not b.disabled][:2]))
+        click(_button(at, "Continue →"))
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return cpu_ms, nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=APP_PATH)
+    parser.add_argument("--mode", choices=["full", "fragment", "split"], default="full")
+    parser.add_argument("--trials", type=int, default=29, help="at most 29 to stay inside one block")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    os.environ["ISM_CLIENT_RT"] = "0"
+    args.app = os.path.abspath(args.app)
+    sys.path.insert(0, os.path.dirname(args.app))
+    install_stub(0)
+    share_script_cache()
+    patch_runner()
+    if args.mode == "fragment":
+        wrap_trial_in_fragment()
+    elif args.mode == "split":
+        split_trial_into_fragment()
+
+    # Warm-up run so imports and first-time caches are not billed to one condition
+    measure(args.app, "neutral", 2, args.mode)
+
+    report = {"app": args.app, "mode": args.mode, "trials": args.trials,
+              "cpu_ms_per_click": {}, "bytes_per_click": {}}
+    for condition in CONDITIONS:
+        cpu_ms, nbytes = measure(args.app, condition, args.trials, args.mode)
+        report["cpu_ms_per_click"][condition] = _summary(cpu_ms)
+        report["bytes_per_click"][condition] = _summary(nbytes)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
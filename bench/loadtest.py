@@ -0,0 +1,420 @@
+"""
+Headless load test for app.py.
+
+Runs N simulated participants through all 4 blocks x 30 rounds with
+Streamlit's AppTest, P participants at a time (one per worker process),
+against a stubbed Supabase client. Writes a JSON report with per-rerun
+latency percentiles, reruns per trial, CPU and RSS per session and overall
+throughput, so runs before and after a change can be compared.
+
+Session state goes through the external session store (checkpoints.py,
+--store, a fresh SQLite file by default) that all workers share. With
+--migrate every block is a separate task, so each participant's blocks are
+played by whichever worker is free, resuming from the store as a browser
+would after the load balancer moved it. --scaling runs the same load at
+several worker counts and reports throughput against one worker.
+
+    python bench/loadtest.py --participants 40 --procs 8 --out before.json
+    python bench/loadtest.py --compare before.json after.json
+    python bench/loadtest.py --participants 16 --migrate --scaling 1 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+
+ROUNDS_PER_BLOCK = 30
+BLOCKS = 4
+
+
+# ===== STUB SUPABASE CLIENT =====
+class _StubQuery:
+    def __init__(self, client, name, rows):
+        self.client = client
+        self.name = name
+        self.rows = rows if isinstance(rows, list) else [rows]
+
+    def execute(self):
+        if self.client.latency_s:
+            time.sleep(self.client.latency_s)
+        with self.client.lock:
+            if self.name == "experiment_data":
+                self.client.rows_written += len(self.rows)
+                self.client.requests += 1
+            else:
+                self.client.other_requests += 1  # trial_timing
+        return self
+
+
+class _StubTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def insert(self, rows, **kwargs):
+        return _StubQuery(self.client, self.name, rows)
+
+    def upsert(self, rows, **kwargs):
+        return _StubQuery(self.client, self.name, rows)
+
+
+class StubSupabase:
+    """Accepts every write after an optional fixed delay and counts experiment_data rows"""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_s = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.rows_written = 0
+        self.requests = 0
+        self.other_requests = 0
+
+    def table(self, name):
+        return _StubTable(self, name)
+
+    @property
+    def postgrest(self):
+        return self
+
+
+STUB = None
+
+
+def install_stub(latency_ms):
+    """Make app.py's create_client() return the stub in this process"""
+    global STUB
+    import streamlit as st
+    import supabase
+    from streamlit.runtime.secrets import Secrets
+
+    STUB = StubSupabase(latency_ms)
+    supabase.create_client = lambda *args, **kwargs: STUB
+    # AppTest's secrets only exist during a script run; the writer thread may
+    # open the client outside one
+    secrets = Secrets()
+    secrets._secrets = {"supabase": {"url": "http://stub", "key": "stub"}}
+    st.secrets = secrets
+
+
+# ===== ONE PARTICIPANT =====
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 2**20 if sys.platform == "darwin" else 2**10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _labels(at):
+    return [b.label for b in at.button]
+
+
+def _button(at, prefix):
+    for b in at.button:
+        if b.label.startswith(prefix) and not b.disabled:
+            return b
+    raise RuntimeError(f"No button starting with {prefix!r}: {_labels(at)}")
+
+
+def run_participant(seed, token=None, one_block=False, think_ms=0.0):
+    """
+    Play a participant to the end, or with one_block only until its next
+    block starts. token resumes a participant from the session store.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    latencies = []
+    runs = 0
+
+    def timed(fn):
+        nonlocal runs
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+        runs += 1
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+
+    cpu_start = time.process_time()
+    rss_start = _rss_mb()
+    wall_start = time.perf_counter()
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.secrets["supabase"] = {"url": "http://stub", "key": "stub"}
+    if token is not None:
+        at.query_params["resume"] = token
+        timed(at.run)
+    else:
+        timed(at.run)
+        timed(_button(at, "Start Experiment").click().run)
+    session = at.session_state["session"]
+    first_block = session.block
+
+    def complete():
+        return any(h.value.startswith("🎉") for h in at.header)
+
+    trials = 0
+    while not complete() and not (one_block and at.session_state["session"].block != first_block):
+        if trials > BLOCKS * ROUNDS_PER_BLOCK:
+            raise RuntimeError("Session did not finish after all rounds")
+        labels = _labels(at)
+        if "Continue to Next Block" in labels:
+            timed(_button(at, "Continue to Next Block").click().run)
+        elif any(h.value == "Break Time!" for h in at.header):
+            time.sleep(0.05)  # ISM_BREAK_SECONDS > 0: wait for the server clock
+            timed(at.run)
+        elif "Continue →" in labels:
+            timed(_button(at, "Continue →").click().run)
+            trials += 1
+        else:
+            choices = [b for b in at.button if not b.disabled][:2]
+            if think_ms:
+                time.sleep(rng.expovariate(1000 / think_ms))
+            timed(rng.choice(choices).click().run)
+
+    return {
+        "token": session.resume_token,
+        "trials": trials,
+        "reruns": runs,
+        "complete": complete(),
+        "latencies_ms": latencies,
+        "cpu_s": time.process_time() - cpu_start,
+        "wall_s": time.perf_counter() - wall_start,
+        "rss_mb": _rss_mb(),
+        "rss_growth_mb": _rss_mb() - rss_start,
+    }
+
+
+def _worker_init(latency_ms, think_ms):
+    global THINK_MS
+    install_stub(latency_ms)
+    THINK_MS = think_ms
+
+
+THINK_MS = 0.0
+
+
+def _worker_run(job):
+    seed, token, one_block = job
+    # AppTest runs app.py as __main__ and leaves it there, after which the
+    # pool could no longer unpickle the next task's function
+    main = sys.modules["__main__"]
+    try:
+        result = run_participant(seed, token, one_block, THINK_MS)
+    finally:
+        sys.modules["__main__"] = main
+    result["seed"] = seed
+    result["pid"] = os.getpid()
+    result["rows_written"] = STUB.rows_written
+    result["insert_requests"] = STUB.requests
+    result["timing_insert_requests"] = STUB.other_requests
+    return result
+
+
+def run_load(args, procs):
+    """Every participant through all blocks on procs workers; (results merged per participant, wall seconds)"""
+    seeds = [args.seed * 100003 + i for i in range(args.participants)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(procs, initializer=_worker_init, initargs=(args.db_latency_ms, args.think_ms)) as pool:
+        if not args.migrate:
+            results = pool.map(_worker_run, [(seed, None, False) for seed in seeds], chunksize=1)
+            for r in results:
+                r["pids"] = [r["pid"]]
+        else:
+            # One task per block: the next block of a participant goes to whichever worker is free
+            results = [None] * len(seeds)
+            while not all(r is not None and r["complete"] for r in results):
+                pending = [i for i, r in enumerate(results) if r is None or not r["complete"]]
+                jobs = [(seeds[i], results[i] and results[i]["token"], True) for i in pending]
+                for i, part in zip(pending, pool.map(_worker_run, jobs, chunksize=1)):
+                    results[i] = _merge_parts(results[i], part)
+    wall_s = time.perf_counter() - start
+    return results, wall_s
+
+
+def _merge_parts(total, part):
+    part["pids"] = [part["pid"]]
+    if total is None:
+        return part
+    for key in ("trials", "reruns", "cpu_s", "wall_s", "rss_growth_mb"):
+        part[key] += total[key]
+    part["latencies_ms"] = total["latencies_ms"] + part["latencies_ms"]
+    part["rss_mb"] = max(part["rss_mb"], total["rss_mb"])
+    part["pids"] = total["pids"] + part["pids"]
+    return part
+
+
+# ===== REPORT =====
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def _summary(values):
+    values = sorted(values)
+    return {
+        "mean": sum(values) / len(values) if values else None,
+        "p50": _percentile(values, 50),
+        "p90": _percentile(values, 90),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_report(results, wall_s, args):
+    latencies = [ms for r in results for ms in r["latencies_ms"]]
+    trials = sum(r["trials"] for r in results)
+    reruns = sum(r["reruns"] for r in results)
+
+    # rows_written is a per-process running total; keep the last value per worker
+    rows_by_pid, requests_by_pid, timing_by_pid = {}, {}, {}
+    for r in results:
+        rows_by_pid[r["pid"]] = max(rows_by_pid.get(r["pid"], 0), r["rows_written"])
+        requests_by_pid[r["pid"]] = max(requests_by_pid.get(r["pid"], 0), r["insert_requests"])
+        timing_by_pid[r["pid"]] = max(timing_by_pid.get(r["pid"], 0), r["timing_insert_requests"])
+    moved = sum(len(set(r["pids"])) > 1 for r in results)
+
+    return {
+        "label": args.label,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "participants": args.participants,
+            "procs": args.procs,
+            "db_latency_ms": args.db_latency_ms,
+            "think_ms": args.think_ms,
+            "trial_writes": os.environ.get("ISM_TRIAL_WRITES", "trial"),
+            "break_seconds": int(os.environ["ISM_BREAK_SECONDS"]),
+            "store": os.environ["ISM_SESSION_STORE"],
+            "migrate": args.migrate,
+            "cpus": os.cpu_count(),
+        },
+        "sessions_completed": sum(r["complete"] for r in results),
+        "sessions_served_by_several_workers": moved,
+        "trials": trials,
+        "rows_written": sum(rows_by_pid.values()),
+        "insert_requests": sum(requests_by_pid.values()),
+        "timing_insert_requests": sum(timing_by_pid.values()),
+        "reruns": reruns,
+        "reruns_per_trial": reruns / trials if trials else None,
+        "rerun_latency_ms": _summary(latencies),
+        "cpu_s_per_session": _summary([r["cpu_s"] for r in results]),
+        "wall_s_per_session": _summary([r["wall_s"] for r in results]),
+        "rss_mb_per_process": _summary([r["rss_mb"] for r in results]),
+        "rss_growth_mb_per_session": _summary([r["rss_growth_mb"] for r in results]),
+        "wall_s": wall_s,
+        "trials_per_second": trials / wall_s if wall_s else None,
+    }
+
+
+COMPARE_KEYS = [
+    ("rerun_latency_ms", "p50"),
+    ("rerun_latency_ms", "p95"),
+    ("rerun_latency_ms", "p99"),
+    ("reruns_per_trial", None),
+    ("cpu_s_per_session", "mean"),
+    ("rss_mb_per_process", "max"),
+    ("trials_per_second", None),
+]
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'metric':<28}{'before':>12}{'after':>12}{'change':>10}")
+    for key, sub in COMPARE_KEYS:
+        b = before[key][sub] if sub else before[key]
+        a = after[key][sub] if sub else after[key]
+        name = f"{key}.{sub}" if sub else key
+        change = f"{(a - b) / b * 100:+.1f}%" if b else "n/a"
+        print(f"{name:<28}{b:>12.3f}{a:>12.3f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--procs", type=int, default=os.cpu_count() or 1,
+                        help="participants running at the same time (one per process)")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                        help="simulated round trip of each stubbed insert")
+    parser.add_argument("--break-seconds", type=int, default=0)
+    parser.add_argument("--think-ms", type=float, default=0.0,
+                        help="mean pause before each choice (exponential), as a participant reading the screen")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--store", default=None,
+                        help="session store spec for checkpoints.py (default: sqlite in a temp dir)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="play each block as its own task, on whichever worker is free")
+    parser.add_argument("--scaling", type=int, nargs="+", metavar="PROCS",
+                        help="run at each of these worker counts and report throughput against the first")
+    parser.add_argument("--label", default=None)
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # Headless runs cannot execute the browser components
+    os.environ["ISM_CLIENT_RT"] = "0"
+    os.environ["ISM_BREAK_SECONDS"] = str(args.break_seconds)
+    os.environ.setdefault("ISM_WAL_DIR", tempfile.mkdtemp(prefix="ism-loadtest-wal-"))
+    os.environ["ISM_SESSION_STORE"] = args.store or "sqlite:" + os.path.join(
+        tempfile.mkdtemp(prefix="ism-loadtest-sessions-"), "sessions.sqlite3")
+    # Measure raw throughput: no admission cap, and a participant moved off a worker would keep a slot there
+    os.environ["ISM_MAX_ACTIVE"] = "0"
+    sys.path.insert(0, REPO_DIR)
+
+    if args.scaling:
+        report = {"label": args.label, "commit": _git_commit(), "runs": {}}
+        for procs in args.scaling:
+            args.procs = procs
+            results, wall_s = run_load(args, procs)
+            run = build_report(results, wall_s, args)
+            base = report["runs"].get(args.scaling[0], run)
+            run["speedup"] = run["trials_per_second"] / base["trials_per_second"]
+            run["efficiency"] = run["speedup"] * args.scaling[0] / procs
+            report["runs"][procs] = run
+            print(f"{procs:>3} workers: {run['trials_per_second']:8.1f} trials/s  "
+                  f"speedup {run['speedup']:.2f}  efficiency {run['efficiency']:.2f}  "
+                  f"rerun p95 {run['rerun_latency_ms']['p95']:.1f} ms", file=sys.stderr)
+    else:
+        results, wall_s = run_load(args, args.procs)
+        report = build_report(results, wall_s, args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
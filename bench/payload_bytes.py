@@ -0,0 +1,84 @@
+"""
+Delta payload per rerun.
+
+Drives one participant through the intro and a number of trials with
+AppTest and adds up the serialized size of every element the script sends
+on each rerun (Element/Block protobufs, i.e. what goes over the websocket
+as deltas, minus per-message framing).
+
+    python bench/payload_bytes.py --trials 20 --out payload.json
+"""
+import argparse
+import json
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import APP_PATH, install_stub, _button  # noqa: E402
+
+
+def rerun_bytes(at):
+    """Total protobuf size of all elements and blocks produced by the last run"""
+    total = 0
+    stack = [at._tree]
+    while stack:
+        node = stack.pop()
+        proto = getattr(node, "proto", None)
+        if proto is not None:
+            total += proto.ByteSize()
+        children = getattr(node, "children", None)
+        if isinstance(children, dict):
+            stack.extend(children.values())
+    return total
+
+
+def measure(trials):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.secrets["supabase"] = {"url": "http://stub", "key": "stub"}
+    samples = {"intro": [], "start": [], "choice": [], "continue": []}
+
+    at.run()
+    samples["intro"].append(rerun_bytes(at))
+    _button(at, "Start Experiment").click().run()
+    samples["start"].append(rerun_bytes(at))
+
+    for _ in range(trials):
+        [b for b in at.button if not b.disabled][0].click().run()
+        samples["choice"].append(rerun_bytes(at))
+        _button(at, "Continue →").click().run()
+        samples["continue"].append(rerun_bytes(at))
+
+    # Steady state: every rerun after the first one of the session
+    later = samples["start"] + samples["choice"] + samples["continue"]
+    return {
+        "condition": at.session_state["session"].condition,
+        "bytes_per_rerun": {k: sum(v) / len(v) for k, v in samples.items()},
+        "first_rerun_bytes": samples["intro"][0],
+        "later_rerun_bytes_mean": sum(later) / len(later),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    os.environ["ISM_CLIENT_RT"] = "0"
+    sys.path.insert(0, REPO_DIR)
+    install_stub(0)
+
+    report = measure(args.trials)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
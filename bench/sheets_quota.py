@@ -0,0 +1,150 @@
+"""
+Mirroring trials to Google Sheets: per-trial appends vs SheetsSink.
+
+Simulated participants click every --click-interval seconds for --seconds
+and every trial row goes to a worksheet served by fake_sheets.FakeSheetsAPI
+(60 write requests a minute, like the real quota, and --latency seconds a
+request). "per-trial" calls append_row() on the click path; "sink" calls
+SheetsSink.enqueue() and lets its thread batch the rows. Reports the time
+the click path spends on the sheet, the requests made, how many were
+throttled and whether every row landed exactly once.
+
+    python bench/sheets_quota.py --mode per-trial --participants 50 --seconds 20
+    python bench/sheets_quota.py --mode sink --participants 50 --seconds 20 --out sink.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sheets import FAKE_KEY, FakeSheetsAPI, fake_client  # noqa: E402
+from loadtest import _summary  # noqa: E402
+from sheets_sink import COLUMNS, SheetsSink  # noqa: E402
+
+
+def trial_row(participant, trial):
+    return {
+        "trial_key": f"p{participant}:{trial // 30 + 1}:{trial % 30}",
+        "participant_id": f"p{participant}",
+        "order_name": "Order1_NVAD",
+        "block": trial // 30 + 1,
+        "condition": "neutral",
+        "round": trial % 30,
+        "choice": "risk",
+        "outcome": "win",
+        "p_win": 0.5,
+        "win_streak": 1,
+        "loss_streak": 0,
+        "balance": 24,
+        "timestamp": "2026-10-18T12:00:00+00:00",
+        "rng_seed": participant,
+        "reaction_time_ms": 850.0,
+        "client_reaction_time_ms": None,
+    }
+
+
+def run(args):
+    api = FakeSheetsAPI(quota=args.quota, latency=args.latency, error_rate=args.error_rate)
+
+    def open_worksheet():
+        return fake_client(api).open_by_key(FAKE_KEY).worksheet("trials")
+
+    sink = None
+    if args.mode == "sink":
+        sink = SheetsSink(open_worksheet, batch_size=args.batch_size, flush_interval=args.flush_interval)
+        write = sink.enqueue
+    else:
+        worksheet = open_worksheet()
+        worksheet.append_row(COLUMNS, value_input_option="RAW")
+
+        def write(row):
+            worksheet.append_row(["" if row[c] is None else row[c] for c in COLUMNS], value_input_option="RAW")
+
+    lock = threading.Lock()
+    click_ms, failed = [], []
+    sent = []
+    stop_at = time.monotonic() + args.seconds
+
+    def participant(pid):
+        rng = random.Random(pid)
+        time.sleep(rng.uniform(0, args.click_interval))
+        trial = 0
+        while time.monotonic() < stop_at:
+            row = trial_row(pid, trial)
+            start = time.perf_counter()
+            try:
+                write(row)
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                click_ms.append(elapsed)
+                (sent if ok else failed).append(row["trial_key"])
+            trial += 1
+            time.sleep(max(0.0, args.click_interval * rng.uniform(0.5, 1.5) - elapsed / 1000))
+
+    threads = [threading.Thread(target=participant, args=(i,)) for i in range(args.participants)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    drain_s = 0.0
+    if sink is not None:
+        start = time.monotonic()
+        sink.flush(timeout=args.drain_timeout)
+        drain_s = time.monotonic() - start
+        sink_stats = sink.stats()
+        sink.close(timeout=1)
+
+    landed = [row[0] for row in api.values[1:]]
+    report = {
+        "mode": args.mode,
+        "participants": args.participants,
+        "seconds": args.seconds,
+        "trials": len(sent) + len(failed),
+        "click_path_ms": _summary(click_ms),
+        "click_path_errors": len(failed),
+        "requests": dict(api.counts),
+        "rows_landed": len(landed),
+        "rows_missing": len(set(sent) - set(landed)),
+        "rows_duplicated": len(landed) - len(set(landed)),
+        "header_ok": api.values[0] == COLUMNS if api.values else False,
+        "drain_seconds": round(drain_s, 2),
+    }
+    if sink is not None:
+        report["sink"] = sink_stats
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["per-trial", "sink"], default="sink")
+    parser.add_argument("--participants", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--click-interval", type=float, default=2.0, help="seconds between a participant's clicks")
+    parser.add_argument("--quota", type=int, default=60, help="fake write (and read) requests per minute")
+    parser.add_argument("--latency", type=float, default=0.15, help="fake seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of writes answered with 503")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=10.0)
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    text = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Cold-start time for app.py, checked against a regression budget.
+
+Each repeat starts a fresh interpreter that imports Streamlit, runs app.py
+once with AppTest and stops as soon as the intro page (the "Start
+Experiment" button) is rendered. One extra run under `python -X importtime`
+breaks the import time down by top-level module.
+
+    python bench/startup.py                  # report, exit 1 if over budget
+    python bench/startup.py --out startup.json
+    python bench/startup.py --update-budget  # accept current numbers (+ headroom)
+
+The budget lives in bench/startup_budget.json:
+    time_to_intro_ms   median wall time from process start to the intro page
+    heavy_modules      modules that must not be imported before the intro page
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BUDGET_PATH = os.path.join(BENCH_DIR, "startup_budget.json")
+
+CHILD_CODE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=60)
+at.secrets["supabase"] = {{"url": "http://stub", "key": "stub"}}
+at.run()
+t2 = time.perf_counter()
+if not any(b.label == "Start Experiment" for b in at.button):
+    raise SystemExit("intro page did not render")
+print(json.dumps({{
+    "import_streamlit_ms": (t1 - t0) * 1000,
+    "first_run_ms": (t2 - t1) * 1000,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def run_child(app, wal_dir, importtime=False):
+    code = CHILD_CODE.format(app=app)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    env = dict(os.environ, ISM_WAL_DIR=wal_dir, ISM_CLIENT_RT="0")
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(app), env=env)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "child failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    # Interpreter start and exit included
+    result["time_to_intro_ms"] = wall_ms
+    return result, proc.stderr
+
+
+def import_breakdown(stderr, top=15):
+    """Cumulative import time (ms) per top-level module from -X importtime output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):  # nested import, already counted in its parent
+            continue
+        name = name.strip().split(".")[0]
+        totals[name] = totals.get(name, 0) + int(cumulative) / 1000
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+    return {name: round(ms, 1) for name, ms in ranked[:top]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=os.path.join(REPO_DIR, "app.py"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--update-budget", action="store_true")
+    parser.add_argument("--headroom", type=float, default=1.5, help="budget = median * headroom")
+    args = parser.parse_args()
+
+    args.app = os.path.abspath(args.app)
+    wal_dir = tempfile.mkdtemp(prefix="startup-wal-")
+
+    with open(BUDGET_PATH) as f:
+        budget = json.load(f)
+
+    runs = [run_child(args.app, wal_dir)[0] for _ in range(args.repeat)]
+    _, stderr = run_child(args.app, wal_dir, importtime=True)
+
+    loaded = set(runs[0]["modules"])
+    heavy_loaded = [m for m in budget["heavy_modules"] if m in loaded]
+    report = {
+        "app": args.app,
+        "repeat": args.repeat,
+        "time_to_intro_ms": statistics.median(r["time_to_intro_ms"] for r in runs),
+        "import_streamlit_ms": statistics.median(r["import_streamlit_ms"] for r in runs),
+        "first_run_ms": statistics.median(r["first_run_ms"] for r in runs),
+        "modules_loaded": len(loaded),
+        "heavy_modules_loaded": heavy_loaded,
+        "import_ms_by_module": import_breakdown(stderr),
+        "budget": budget,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.update_budget:
+        budget["time_to_intro_ms"] = round(report["time_to_intro_ms"] * args.headroom)
+        with open(BUDGET_PATH, "w") as f:
+            f.write(json.dumps(budget, indent=2) + "\n")
+        print(f"budget updated: time_to_intro_ms = {budget['time_to_intro_ms']}")
+        return
+
+    failures = []
+    if report["time_to_intro_ms"] > budget["time_to_intro_ms"]:
+        failures.append(f"time to intro {report['time_to_intro_ms']:.0f} ms > budget {budget['time_to_intro_ms']} ms")
+    if heavy_loaded:
+        failures.append(f"imported before the intro page: {', '.join(heavy_loaded)}")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Insert throughput of each storage backend (storage.py), per batch size.
+
+Each sink gets --rows trial rows (or as many as fit in --seconds) in
+batches of 1 (every trial on its own), 30 (a block, ISM_TRIAL_WRITES=block)
+and 500 (a WAL replay chunk), from one thread as TrialWriter sends them.
+Reports rows/s, per-batch latency percentiles and bytes on disk.
+
+The supabase sink talks to bench/rest_pool.py's stand-in PostgREST server
+(its own process, --latency-ms per request), so its numbers are network
+round trips at that latency rather than Supabase's own.
+
+    python bench/storage_sinks.py --out sinks.json
+    python bench/storage_sinks.py --sinks sqlite jsonl jsonl-nofsync --batches 1 30
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest import _summary  # noqa: E402
+from rest_pool import FAKE_KEY, start_server, trial_row  # noqa: E402
+from storage import FanOutBackend, JSONLBackend, SQLiteBackend, SupabaseBackend  # noqa: E402
+
+SINKS = ["sqlite", "jsonl", "jsonl-nofsync", "supabase", "supabase+sqlite", "sqlite+jsonl"]
+
+
+def make_sink(name, directory, url):
+    def one(kind):
+        if kind == "sqlite":
+            return SQLiteBackend(os.path.join(directory, "trials.sqlite3"))
+        if kind == "jsonl":
+            return JSONLBackend(os.path.join(directory, "trials.jsonl"))
+        if kind == "jsonl-nofsync":
+            return JSONLBackend(os.path.join(directory, "trials.jsonl"), fsync=False)
+        if kind == "supabase":
+            return SupabaseBackend(lambda: (url, FAKE_KEY))
+        raise ValueError(kind)
+
+    parts = name.split("+")
+    return one(parts[0]) if len(parts) == 1 else FanOutBackend([one(part) for part in parts])
+
+
+def _disk_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def run(sink, rows, batch_size, seconds):
+    latencies = []
+    sent = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while sent < rows and time.perf_counter() < deadline:
+        batch = [trial_row(sent // 120, sent + i) for i in range(batch_size)]
+        t = time.perf_counter()
+        sink.insert_many(batch)
+        latencies.append((time.perf_counter() - t) * 1000)
+        sent += batch_size
+    sink.flush()
+    elapsed = time.perf_counter() - start
+    return sent, elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sinks", nargs="+", default=SINKS, choices=SINKS)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 30, 500])
+    parser.add_argument("--rows", type=int, default=20000, help="rows per (sink, batch size)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="time limit per (sink, batch size)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stand-in PostgREST time per request")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    proc = url = None
+    if any("supabase" in name for name in args.sinks):
+        proc, url = start_server(args.latency_ms)
+    report = {"latency_ms": args.latency_ms, "sinks": {}}
+    try:
+        for name in args.sinks:
+            for batch_size in args.batches:
+                directory = tempfile.mkdtemp(prefix="ism-sink-")
+                try:
+                    sink = make_sink(name, directory, url)
+                    sink.insert_many([trial_row(-1, 0)])  # open files and connections outside the timing
+                    sent, elapsed, latencies = run(sink, args.rows, batch_size, args.seconds)
+                    sink.close()
+                    result = {
+                        "rows": sent,
+                        "rows_per_s": round(sent / elapsed, 1),
+                        "batch_ms": _summary(latencies),
+                        "disk_bytes_per_row": round(_disk_bytes(directory) / (sent + 1), 1) if name != "supabase" else None,
+                    }
+                finally:
+                    shutil.rmtree(directory, ignore_errors=True)
+                report["sinks"].setdefault(name, {})[batch_size] = result
+                print(f"{name:<16} batch {batch_size:>4}: {result['rows_per_s']:>10.1f} rows/s  "
+                      f"p50 {result['batch_ms']['p50']:.3f} ms  p99 {result['batch_ms']['p99']:.3f} ms",
+                      file=sys.stderr)
+    finally:
+        if proc is not None:
+            proc.terminate()
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import threading
+import time
+
+# Block-level trial writes (ISM_TRIAL_WRITES=block, see experiment.log_trial).
+#
+# In that mode a block's trial rows wait in Session.pending_rows, and each is
+# also appended to the checkpoint store as it is logged (append_pending).
+# They go to the database as one bulk insert when the block ends. A
+# participant who leaves mid-block never reaches that point, so this
+# sweeper looks in the checkpoint store for sessions that still hold rows
+# but have not been saved for idle_seconds, and writes those rows as they
+# are.
+#
+# The sweeper and experiment.flush_block both take the rows with the
+# store's claim_pending, which removes and returns them in one step. Two
+# workers sweeping the same session, a sweep racing the participant's own
+# flush, a participant who comes back after a sweep: in every case each
+# row is written once, to every backend including the Sheets mirror and
+# JSONL. From its claim on, a row lives in the writer's queue like any row
+# in per-trial mode.
+
+
+class PendingRowSweeper:
+    """
+    store: CheckpointStore holding the sessions
+    write_rows: callable taking a list of row dicts (queues them for the database)
+    idle_seconds: a session not saved for this long is treated as abandoned
+    interval: seconds between sweeps
+    """
+
+    def __init__(self, store, write_rows, idle_seconds=600.0, interval=60.0):
+        self.store = store
+        self.write_rows = write_rows
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._sweeps = 0
+        self._sessions_swept = 0
+        self._rows_swept = 0
+        self._last_sweep_ms = None
+        self._thread = None
+
+    def start(self):
+        """Sweep every interval seconds on a background thread; returns self"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="block-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def sweep(self):
+        """Write the pending rows of every abandoned session once; returns the number of rows"""
+        start = time.perf_counter()
+        sessions = rows = 0
+        for token in self.store.abandoned_tokens(self.idle_seconds):
+            claimed = self.store.claim_pending(token)
+            if not claimed:  # taken by another worker's sweeper or the participant's flush
+                continue
+            self.write_rows(claimed)
+            sessions += 1
+            rows += len(claimed)
+        if sessions:
+            print(f"Block sweeper: wrote {rows} pending rows of {sessions} abandoned sessions")
+        with self._lock:
+            self._sweeps += 1
+            self._sessions_swept += sessions
+            self._rows_swept += rows
+            self._last_sweep_ms = (time.perf_counter() - start) * 1000
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sweeps": self._sweeps,
+                "sessions_swept": self._sessions_swept,
+                "rows_swept": self._rows_swept,
+                "last_sweep_ms": self._last_sweep_ms,
+            }
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Block sweep failed: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,22 @@
+import os
+
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "break_countdown")
+_break_countdown = components.declare_component("break_countdown", path=_FRONTEND_DIR)
+
+
+def break_countdown(remaining_seconds, break_id, key=None):
+    """
+    Moving "Break over in N" box, counted down and animated in the browser.
+
+    The component sends one value back when its timer reaches zero, which
+    triggers a single rerun; the server then decides (from its own clock)
+    whether the break is really over.
+    """
+    return _break_countdown(
+        remaining_seconds=remaining_seconds,
+        break_id=break_id,
+        key=key or f"break_countdown_{break_id}",
+        default=None,
+    )
@@ -0,0 +1,489 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from game import session_rng
+from session import Session
+
+# Each participant's Session, kept outside the server process: for resuming
+# after a reload or a server restart, and so that any app.py worker behind a
+# load balancer can serve any participant.
+#
+# A participant's record is created once when the experiment starts (id,
+# seed, block order) and after that only its cursor is rewritten: a JSON
+# array of the CURSOR_FIELDS, about 150 bytes, plus a version number that
+# goes up with every save. A worker holding a Session compares versions at
+# the start of each rerun and reloads when another worker has moved on; a
+# save from a stale copy (say, a second tab on another worker) is refused
+# instead of overwriting the newer state. A stored copy that is behind the
+# participant's progress (progress_of) is never loaded over a live Session.
+#
+# With block-level trial writes (block_writes.py) the rows of the current
+# block are kept next to the record, append-only: each trial adds its row
+# once (about 400 bytes). Whoever writes them to the database (the
+# participant's flush at the end of the block, or a worker's sweeper) first
+# claims them: claim_pending removes and returns the rows in one step, so
+# each row is handed out once. They are not part of the cursor, so a save
+# stays the same size however far into the block the participant is.
+#
+# The outcome generator is not stored: it draws exactly once per risky
+# choice (game.session_rng), so the draw count is its state and restoring
+# skips ahead that many draws. Feedback messages are cosmetic and not
+# logged; a restored session gets a message generator derived from its seed
+# and position.
+#
+# Stores are chosen with a spec string (open_checkpoint_store):
+#   sqlite:<path>   one SQLite file, shared by the processes of one host
+#   files:<dir>     one small JSON file per participant, for a shared volume
+# Another backend (Redis, Postgres, ...) only has to implement _insert,
+# _update (a compare-and-set on the version), _get and _version of
+# CheckpointStore, plus the pending-row methods for block-level writes.
+
+RESUME_PARAM = "resume"
+
+CURSOR_FIELDS = (
+    "started", "block", "block_index", "round", "condition", "in_break",
+    "balance", "win_streak", "loss_streak", "bias_rounds_left", "bias_rounds_active",
+    "last_risk_outcome", "last_outcome", "last_choice", "awaiting_feedback", "debug_p_win",
+    "reaction_time_ms", "client_reaction_time_ms", "outcome_draws", "break_start_time",
+)
+
+
+def new_token():
+    return secrets.token_urlsafe(16)
+
+
+def progress_of(s):
+    """How far a participant has got; only ever grows as they play"""
+    return (s.started, s.block, s.round, s.awaiting_feedback, s.outcome_draws)
+
+
+def cursor_of(s):
+    values = [getattr(s, name) for name in CURSOR_FIELDS]
+    if s.break_start_time is not None:
+        values[CURSOR_FIELDS.index("break_start_time")] = s.break_start_time.timestamp()
+    return json.dumps(values, separators=(",", ":"))
+
+
+def restore_session(token, participant_id, rng_seed, block_order, cursor, version):
+    s = Session(rng_seed=rng_seed, block_order=json.loads(block_order))
+    s.participant_id = participant_id
+    s.resume_token = token
+    s.checkpoint_version = version
+    for name, value in zip(CURSOR_FIELDS, json.loads(cursor)):
+        setattr(s, name, value)
+    if s.break_start_time is not None:
+        s.break_start_time = datetime.fromtimestamp(s.break_start_time, timezone.utc)
+
+    for _ in range(s.outcome_draws):
+        s.outcome_rng.random()
+    s.message_rng = session_rng(rng_seed, f"message:{s.block}:{s.round}")
+    # The page is drawn from scratch in the new browser session. The round
+    # started on another clock, so its reaction time and render time are not
+    # known; they are logged as NULL until the next round starts here.
+    s.round_start_ns = time.perf_counter_ns()
+    s.timing_valid = False
+    s.animation_shown = False
+    s.stylesheet_injected = False
+    return s
+
+
+class CheckpointStore:
+    """
+    create/save/load/refresh of Sessions, with timing and error counters.
+    Storage errors are printed and counted, never raised: a lost checkpoint
+    only costs the ability to resume.
+    """
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._writes = 0
+        self._write_ms = 0.0
+        self._max_write_ms = 0.0
+        self._restores = 0
+        self._refreshes = 0
+        self._conflicts = 0
+        self._stale_refused = 0
+        self._errors = 0
+
+    def create(self, s):
+        """First checkpoint of a session; s.resume_token must be set"""
+        s.checkpoint_version = 1
+        self._timed(self._insert, s.resume_token, (
+            s.participant_id, s.rng_seed, json.dumps(s.block_order), cursor_of(s), 1, time.time(),
+        ))
+
+    def save(self, s):
+        s.checkpoint_version += 1
+        saved = self._timed(self._update, s.resume_token, cursor_of(s), s.checkpoint_version, time.time())
+        if saved is None:
+            # Storage error, not a conflict: the stored version did not move, so neither does ours
+            s.checkpoint_version -= 1
+        elif saved is False:
+            # Another worker saved a newer version first; force a reload on the next rerun
+            s.checkpoint_version = 0
+            with self._stats_lock:
+                self._conflicts += 1
+
+    def load(self, token):
+        """The Session saved under token, or None"""
+        ok, record = self._guarded(self._get, token)
+        if not ok or record is None:
+            return None
+        s = restore_session(token, *record)
+        ok, rows = self._guarded(self._pending, token)
+        s.pending_rows = rows if ok else []
+        with self._stats_lock:
+            self._restores += 1
+        return s
+
+    def refresh(self, s):
+        """
+        A newer copy of s when another worker has saved it since, else None.
+        A stored copy that is behind s (a save of s that failed, or was lost)
+        is not returned; s takes over its version so that s's next save
+        replaces it.
+        """
+        ok, version = self._guarded(self._version, s.resume_token)
+        if not ok or version is None or version <= s.checkpoint_version:
+            return None
+        fresh = self.load(s.resume_token)
+        if fresh is None:
+            return None
+        if progress_of(fresh) < progress_of(s):
+            s.checkpoint_version = fresh.checkpoint_version
+            with self._stats_lock:
+                self._stale_refused += 1
+            return None
+        with self._stats_lock:
+            self._refreshes += 1
+        return fresh
+
+    def append_pending(self, s, rows):
+        """Keep rows (block_writes.py) with s's record until claimed; False if they were not stored"""
+        return self._timed(self._append_pending, s.resume_token, rows) is not None
+
+    def claim_pending(self, token):
+        """
+        Remove and return the rows held for token, in one step, so that of
+        two callers racing for them (the participant's flush, a sweeper)
+        only one gets each row. None if the store could not be read.
+        """
+        ok, rows = self._guarded(self._claim_pending, token)
+        return rows if ok else None
+
+    def abandoned_tokens(self, idle_seconds):
+        """Sessions holding unwritten trial rows (block_writes.py) and not saved for idle_seconds"""
+        ok, tokens = self._guarded(self._stale_pending, time.time() - idle_seconds)
+        return tokens if ok else []
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "writes": self._writes,
+                "avg_write_ms": self._write_ms / self._writes if self._writes else None,
+                "max_write_ms": self._max_write_ms,
+                "restores": self._restores,
+                "refreshes": self._refreshes,
+                "conflicts": self._conflicts,
+                "stale_refused": self._stale_refused,
+                "errors": self._errors,
+            }
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        ok, result = self._guarded(fn, *args)
+        if not ok:
+            return None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._writes += 1
+            self._write_ms += elapsed_ms
+            self._max_write_ms = max(self._max_write_ms, elapsed_ms)
+        return result
+
+    def _guarded(self, fn, *args):
+        """(True, fn(*args)), or (False, None) once the error is printed and counted"""
+        try:
+            return True, fn(*args)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Checkpoint {fn.__name__.strip('_')} failed: {e}")
+            with self._stats_lock:
+                self._errors += 1
+            return False, None
+
+    # Backends implement these
+
+    def _insert(self, token, record):
+        """record: (participant_id, rng_seed, block_order JSON, cursor JSON, version, updated_at)"""
+        raise NotImplementedError
+
+    def _update(self, token, cursor, version, updated_at):
+        """Store the new cursor only if the stored version is version - 1; False if it was not"""
+        raise NotImplementedError
+
+    def _get(self, token):
+        """(participant_id, rng_seed, block_order, cursor, version) or None"""
+        raise NotImplementedError
+
+    def _version(self, token):
+        raise NotImplementedError
+
+    def _append_pending(self, token, rows):
+        """Keep rows for token (a repeated trial_key is kept once); returns True"""
+        raise NotImplementedError
+
+    def _pending(self, token):
+        """Row dicts appended for token and not claimed, in order"""
+        raise NotImplementedError
+
+    def _claim_pending(self, token):
+        """Remove and return _pending(token) atomically: an append is either in it or kept"""
+        raise NotImplementedError
+
+    def _stale_pending(self, cutoff):
+        """Tokens saved before cutoff (epoch seconds) that have pending rows"""
+        raise NotImplementedError
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    SQLite file shared by every session thread (and server process on the host).
+    WAL journal with synchronous=NORMAL: a commit survives the process being
+    killed, without an fsync per trial.
+    """
+
+    SCHEMA = """
+    create table if not exists checkpoints (
+        token text primary key,
+        participant_id text not null,
+        rng_seed integer not null,
+        block_order text not null,
+        cursor text not null,
+        version integer not null,
+        updated_at real not null
+    );
+    create table if not exists pending_rows (
+        token text not null,
+        trial_key text not null,
+        row text not null,
+        primary key (token, trial_key)
+    );
+    """
+
+    def __init__(self, path, max_age_days=14):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("pragma journal_mode=wal")
+        self._db.execute("pragma synchronous=normal")
+        self._db.execute("pragma busy_timeout=5000")
+        self._db.executescript(self.SCHEMA)
+        columns = [row[1] for row in self._db.execute("pragma table_info(checkpoints)")]
+        if "version" not in columns:  # file written before versions were added
+            self._db.execute("alter table checkpoints add column version integer not null default 1")
+        if max_age_days:
+            self._db.execute("delete from checkpoints where updated_at < ?", (time.time() - max_age_days * 86400,))
+            self._db.execute("delete from pending_rows where token not in (select token from checkpoints)")
+
+    def _insert(self, token, record):
+        with self._lock:
+            self._db.execute("insert or replace into checkpoints values (?, ?, ?, ?, ?, ?, ?)", (token, *record))
+
+    def _update(self, token, cursor, version, updated_at):
+        with self._lock:
+            cur = self._db.execute(
+                "update checkpoints set cursor = ?, version = ?, updated_at = ? where token = ? and version = ?",
+                (cursor, version, updated_at, token, version - 1),
+            )
+        return cur.rowcount == 1
+
+    def _get(self, token):
+        with self._lock:
+            return self._db.execute(
+                "select participant_id, rng_seed, block_order, cursor, version from checkpoints where token = ?",
+                (token,),
+            ).fetchone()
+
+    def _version(self, token):
+        with self._lock:
+            row = self._db.execute("select version from checkpoints where token = ?", (token,)).fetchone()
+        return row[0] if row else None
+
+    def _append_pending(self, token, rows):
+        values = [(token, row["trial_key"], json.dumps(row, separators=(",", ":"))) for row in rows]
+        with self._lock:
+            self._db.executemany("insert or ignore into pending_rows values (?, ?, ?)", values)
+        return True
+
+    def _pending(self, token):
+        with self._lock:
+            rows = self._db.execute("select row from pending_rows where token = ? order by rowid", (token,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _claim_pending(self, token):
+        # One write transaction: another process's claim or append waits for it
+        with self._lock:
+            self._db.execute("begin immediate")
+            try:
+                rows = self._db.execute(
+                    "select row from pending_rows where token = ? order by rowid", (token,)
+                ).fetchall()
+                self._db.execute("delete from pending_rows where token = ?", (token,))
+                self._db.execute("commit")
+            except BaseException:
+                self._db.execute("rollback")
+                raise
+        return [json.loads(row[0]) for row in rows]
+
+    def _stale_pending(self, cutoff):
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "select token from checkpoints where updated_at < ? "
+                "and exists (select 1 from pending_rows p where p.token = checkpoints.token)",
+                (cutoff,),
+            )]
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    One JSON file per participant under directory, replaced atomically on
+    every save (write to a temp file, then os.replace), so readers on other
+    processes or hosts sharing the directory never see a torn record.
+    Pending rows go to <token>.pending.jsonl, one appended line per row; a
+    line cut short by a crash is skipped on reading. Appends and claims
+    hold a flock on <token>.pending.lock, and a claim renames the file away
+    under it, so no append can land in a file that is being claimed (on a
+    network volume, only as far as its server supports flock).
+    Not fsynced: a host crash can lose the last few saves. The version
+    check on save is read-then-replace, so two processes saving the same
+    participant in the same instant can both succeed.
+    """
+
+    def __init__(self, directory, max_age_days=14):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        if max_age_days:
+            cutoff = time.time() - max_age_days * 86400
+            for entry in os.scandir(directory):
+                if entry.name.endswith((".json", ".jsonl", ".lock")) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+
+    def _path(self, token, suffix=".json"):
+        # Tokens are URL-safe base64, which is also safe as a file name
+        if not token or "/" in token or token.startswith("."):
+            raise ValueError(f"bad checkpoint token {token!r}")
+        return os.path.join(self.directory, f"{token}{suffix}")
+
+    def _write(self, token, record):
+        path = self._path(token)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(record, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def _insert(self, token, record):
+        self._write(token, record)
+
+    def _update(self, token, cursor, version, updated_at):
+        record = self._read(token)
+        if record is None or record[4] != version - 1:
+            return False
+        self._write(token, [*record[:3], cursor, version, updated_at])
+        return True
+
+    def _read(self, token):
+        try:
+            with open(self._path(token)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _get(self, token):
+        record = self._read(token)
+        return None if record is None else tuple(record[:5])
+
+    def _version(self, token):
+        record = self._read(token)
+        return None if record is None else record[4]
+
+    def _append_pending(self, token, rows):
+        data = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+        with _file_lock(self._path(token, ".pending.lock")):
+            with open(self._path(token, ".pending.jsonl"), "a") as f:
+                f.write(data)
+        return True
+
+    def _pending(self, token):
+        return self._read_pending(self._path(token, ".pending.jsonl"))
+
+    def _claim_pending(self, token):
+        path = self._path(token, ".pending.jsonl")
+        claimed = f"{path}.{os.getpid()}.{threading.get_ident()}.claim"
+        with _file_lock(self._path(token, ".pending.lock")):
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                return []
+        rows = self._read_pending(claimed)
+        os.remove(claimed)
+        return rows
+
+    def _read_pending(self, path):
+        rows = {}
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    rows.setdefault(row["trial_key"], row)
+        except FileNotFoundError:
+            pass
+        return list(rows.values())
+
+    def _stale_pending(self, cutoff):
+        tokens = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".pending.jsonl"):
+                continue
+            token = entry.name[:-len(".pending.jsonl")]
+            record = self._read(token)
+            if record is not None and record[5] < cutoff:
+                tokens.append(token)
+        return tokens
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on path (created if missing) for the threads and processes sharing it"""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        yield
+
+
+def open_checkpoint_store(spec):
+    """A CheckpointStore for "sqlite:<path>" or "files:<directory>" """
+    kind, _, location = spec.partition(":")
+    if kind == "sqlite" and location:
+        return SQLiteCheckpointStore(location)
+    if kind == "files" and location:
+        return FileCheckpointStore(location)
+    raise ValueError(f"Unknown checkpoint store {spec!r}; expected sqlite:<path> or files:<directory>")
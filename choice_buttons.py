@@ -0,0 +1,53 @@
+import os
+from functools import partial
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "choice_buttons")
+_choice_buttons = components.declare_component("choice_buttons", path=_FRONTEND_DIR)
+
+# Set ISM_CLIENT_RT=0 to fall back to plain st.button (e.g. headless AppTest runs,
+# which cannot execute the component's JavaScript)
+CLIENT_RT_ENABLED = os.environ.get("ISM_CLIENT_RT", "1") != "0"
+
+
+def _on_component_choice(key, round_id, on_safe, on_risk):
+    value = st.session_state.get(key)
+    # Ignore values left over from an earlier round (the component keeps its last value)
+    if not value or value.get("round_id") != round_id:
+        return
+    if value["choice"] == "safe":
+        on_safe(value.get("client_rt_ms"))
+    elif value["choice"] == "risk":
+        on_risk(value.get("client_rt_ms"))
+
+
+def choice_buttons(safe_label, risk_label, round_id, disabled, on_safe, on_risk, key="choice_buttons"):
+    """
+    Safe / risky choice buttons with browser-side reaction time.
+
+    The browser records performance.now() when the buttons are painted for
+    round_id and again on click, so the RT excludes websocket and rerun time.
+    on_safe / on_risk are called with that client RT in ms (None when the
+    plain st.button fallback is in use).
+    """
+    if not CLIENT_RT_ENABLED:
+        col1, col2 = st.columns(2, gap="large")
+        with col1:
+            st.button(safe_label, on_click=on_safe, args=(None,), disabled=disabled,
+                      use_container_width=True)
+        with col2:
+            st.button(risk_label, on_click=on_risk, args=(None,), disabled=disabled,
+                      use_container_width=True)
+        return
+
+    _choice_buttons(
+        safe_label=safe_label,
+        risk_label=risk_label,
+        round_id=round_id,
+        disabled=disabled,
+        key=key,
+        default=None,
+        on_change=partial(_on_component_choice, key, round_id, on_safe, on_risk),
+    )
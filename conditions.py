@@ -0,0 +1,217 @@
+import time
+
+import streamlit as st
+
+from banners import emotional_context, balance_metric_html, visual_banner_html, affective_banner_html
+from choice_buttons import choice_buttons
+from experiment import choose_safe, choose_risk, continue_after_feedback
+from game import ROUNDS_PER_BLOCK
+from session import get_session
+
+# Table-driven block conditions. Everything static about a condition (labels,
+# captions, message pools, which banner it shows) is built once here at
+# import; render_trial() draws the shared layout and calls only the hooks the
+# active condition defines.
+
+# Message pools for variety in feedback
+NEUTRAL_MESSAGES = {
+    "safe": ["You chose the safe option. +1 added."],
+    "win": ["You chose the risky option and won. +4 added."],
+    "loss": ["You chose the risky option and lost. -2 deducted."],
+}
+
+VISUAL_MESSAGES = {
+    "safe": [
+        "You chose the safe option. +1 added.",
+        "Safe choice selected. +1 to your balance.",
+        "You played it safe. +1 earned."
+    ],
+    "win": [
+        "You chose the risky option and won. +4 added.",
+        "Your risky bet paid off. +4 to your balance.",
+        "You took the risk and won. +4 earned."
+    ],
+    "loss": [
+        "You chose the risky option and lost. -2 deducted.",
+        "Risky bet didn't pay off. -2 from your balance.",
+        "You took the risk and lost. -2 deducted."
+    ]
+}
+
+AFFECTIVE_MESSAGES = {
+    "safe": [
+        "😌 You chose stability. A calm +1.",
+        "🛡️ Playing it safe. Steady +1 added.",
+        "✓ Safe and sound. +1 to your balance."
+    ],
+    "win_neutral": [  # For streaks 0-2
+        "🎉 Nice hit! +4 added.",
+        "✨ You won the risky bet! +4 earned.",
+        "💵 Risky choice paid off! +4 to your balance."
+    ],
+    "win_hot": [  # For streaks 3+
+        "🚀 Another win! The streak keeps rolling!",
+        "🔥 You're unstoppable! +4 added to the fire!",
+        "⚡ The momentum continues! +4 and counting!"
+    ],
+    "loss_neutral": [  # For streaks 0-2
+        "😬 Tough loss. -2 deducted.",
+        "💸 Didn't work out this time. -2 from your balance.",
+        "😕 The risk didn't pay off. -2 deducted."
+    ],
+    "loss_cold": [  # For streaks 3+
+        "😖 Ouch, another loss. The slide continues.",
+        "💔 The streak persists. -2 deducted.",
+        "😣 Tough break again. -2 from your balance."
+    ]
+}
+
+DESALIENCE_MESSAGES = {
+    "safe": ["Outcome: +1"],
+    "win": ["Outcome: +4"],
+    "loss": ["Outcome: -2"],
+}
+
+# Feedback box per outcome
+FEEDBACK_BOX = {"safe": st.info, "win": st.success, "loss": st.error}
+
+PLAIN_LABELS = ("Safe Option\n(+1)", "Risky Option\n(+4 / -2)")
+
+AFFECTIVE_RISK_LABELS = {
+    "hot": "🔥 Press the advantage (+4 / -2)",
+    "cold": "💥 Try to bounce back (+4 / -2)",
+    "neutral": "🎯 Take the risk (+4 / -2)",
+}
+
+
+class Condition:
+    """
+    Static description of one block condition.
+
+    banner(win_streak, loss_streak, awaiting_feedback, last_outcome) -> html, or None
+    labels(tone) -> (safe_label, risk_label)
+    caption_below(tone) -> str, or None
+    messages(outcome, tone) -> message pool for the feedback box
+    uses_tone: compute emotional_context() only for conditions that need it
+    """
+
+    def __init__(self, name, labels, messages, banner=None, caption_above=None, caption_below=None,
+                 uses_tone=False):
+        self.name = name
+        self.labels = labels
+        self.messages = messages
+        self.banner = banner
+        self.caption_above = caption_above
+        self.caption_below = caption_below
+        self.uses_tone = uses_tone
+
+
+def _affective_messages(outcome, tone):
+    if outcome == "win":
+        return AFFECTIVE_MESSAGES["win_hot" if tone == "hot" else "win_neutral"]
+    if outcome == "loss":
+        return AFFECTIVE_MESSAGES["loss_cold" if tone == "cold" else "loss_neutral"]
+    return AFFECTIVE_MESSAGES["safe"]
+
+
+CONDITIONS = {
+    "neutral": Condition(
+        "neutral",
+        labels=lambda tone: PLAIN_LABELS,
+        messages=lambda outcome, tone: NEUTRAL_MESSAGES[outcome],
+    ),
+    "visual": Condition(
+        "visual",
+        labels=lambda tone: PLAIN_LABELS,
+        messages=lambda outcome, tone: VISUAL_MESSAGES[outcome],
+        banner=lambda ws, ls, awaiting, last: visual_banner_html(ws, ls),
+    ),
+    "affective": Condition(
+        "affective",
+        labels=lambda tone: ("🛑 Play it safe (+1)", AFFECTIVE_RISK_LABELS[tone]),
+        messages=_affective_messages,
+        banner=affective_banner_html,
+        caption_below=lambda tone: (
+            "⏳ Momentum like this rarely lasts." if tone in ("hot", "cold")
+            else "⏳ Each round is a fresh opportunity."
+        ),
+        uses_tone=True,
+    ),
+    "de-salience": Condition(
+        "de-salience",
+        labels=lambda tone: PLAIN_LABELS,
+        messages=lambda outcome, tone: DESALIENCE_MESSAGES[outcome],
+        caption_above="Each block is independent. Previous outcomes do not affect future results.",
+    ),
+}
+
+
+def _metrics_row(s, condition):
+    # Clean info display at top
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Block", s.block)
+    with col2:
+        st.metric("Round", f"{s.round + 1}/{ROUNDS_PER_BLOCK}")
+    with col3:
+        _balance_metric(s, condition)
+
+
+def _balance_metric(s, condition):
+    if s.awaiting_feedback and s.last_outcome and not s.animation_shown:
+        # Cached per (balance, condition, outcome)
+        st.markdown(balance_metric_html(s.balance, condition, s.last_outcome), unsafe_allow_html=True)
+        s.animation_shown = True
+    else:
+        st.metric("Balance", s.balance)
+
+
+def render_trial():
+    """One trial screen for the active condition"""
+    s = get_session()
+    cond = CONDITIONS[s.condition]
+    awaiting = s.awaiting_feedback
+    last_outcome = s.last_outcome
+
+    tone = emotional_context(s.win_streak, s.loss_streak)["tone"] if cond.uses_tone else None
+
+    _metrics_row(s, cond.name)
+    st.divider()
+
+    if cond.banner is not None:
+        st.markdown(cond.banner(s.win_streak, s.loss_streak, awaiting, last_outcome if awaiting else None),
+                    unsafe_allow_html=True)
+    if cond.caption_above:
+        st.caption(cond.caption_above)
+
+    _choice_area(s, cond, tone)
+
+
+def _choice_area(s, cond, tone):
+    """Choice buttons, feedback and Continue"""
+    awaiting = s.awaiting_feedback
+    last_outcome = s.last_outcome
+
+    safe_label, risk_label = cond.labels(tone)
+    choice_buttons(safe_label, risk_label, f"{s.block}-{s.round}", awaiting, choose_safe, choose_risk)
+    if not awaiting and s.render_ns is None:
+        s.render_ns = time.perf_counter_ns()  # first time this round's buttons went to the browser
+
+    if cond.caption_below is not None:
+        st.caption(cond.caption_below(tone))
+
+    # awaiting feedback from the player
+    if awaiting:
+        st.divider()
+
+        feedback_col, button_col = st.columns([2, 1])
+
+        with feedback_col:
+            if last_outcome in FEEDBACK_BOX:
+                pool = cond.messages(last_outcome, tone)
+                message = pool[0] if len(pool) == 1 else s.message_rng.choice(pool)
+                FEEDBACK_BOX[last_outcome](message)
+
+        with button_col:
+            st.write("")
+            st.button("Continue →", on_click=continue_after_feedback, use_container_width=True)
@@ -0,0 +1,451 @@
+import atexit
+import os
+import time
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from admission import AdmissionController
+from banners import cache_stats
+from block_writes import PendingRowSweeper
+from checkpoints import RESUME_PARAM, new_token, open_checkpoint_store
+from game import biased_risk_outcome, consume_bias_round, update_streaks, ROUNDS_PER_BLOCK
+from metrics import METRICS
+from session import SESSION_KEY, get_session
+from sheets_sink import SheetsSink, service_account_worksheet
+from storage import TIMING_TABLE, open_storage
+from trial_wal import WalReplayer, open_worker_wal
+from trial_writer import TrialWriter
+
+# Session callbacks and trial logging. This module is imported once per
+# process, so the callbacks below are created once instead of being
+# redefined as closures on every rerun of app.py.
+
+# How often the waiting room asks for a slot (app.py)
+WAITING_POLL_SECONDS = float(os.environ.get("ISM_WAITING_POLL_SECONDS", "5"))
+
+# "trial": each trial row is queued for the database as it is logged.
+# "block": a block's rows wait in the session's checkpoint and are queued
+# together when the block ends (block_writes.py).
+TRIAL_WRITES = os.environ.get("ISM_TRIAL_WRITES", "trial")
+
+# ISM_TRIAL_TIMING=1: log the latency columns with every trial and write a
+# trial_timing row (queue and commit time) for each one the writer stores.
+# Off by default: both need migrations/005_trial_timing.sql, and the
+# trial_timing rows double the inserts.
+TRIAL_TIMING = os.environ.get("ISM_TRIAL_TIMING", "0") == "1"
+
+
+# ===== STORAGE =====
+def _supabase_credentials():
+    return st.secrets["supabase"]["url"], st.secrets["supabase"]["key"]
+
+
+@st.cache_resource
+def init_storage():
+    """
+    Where trial rows are written (storage.py): ISM_STORAGE, default
+    "supabase" (one pooled client per process, ISM_DB_* settings). The
+    sqlite:<path> and jsonl:<path> backends need no secrets, so the app can
+    also run offline; a comma list writes to several.
+    """
+    storage = open_storage(os.environ.get("ISM_STORAGE", "supabase"), supabase_credentials=_supabase_credentials)
+    atexit.register(storage.close)
+    return storage
+
+
+def insert_trial_rows(rows):
+    """
+    One bulk write to the configured storage. Rows that already exist (same
+    trial_key) are skipped, so retries, WAL replay and double clicks are safe.
+    """
+    init_storage().insert_many(rows)
+
+
+@st.cache_resource
+def init_timing_storage():
+    """The trial_timing table in the same storage as the trials"""
+    storage = open_storage(
+        os.environ.get("ISM_STORAGE", "supabase"), supabase_credentials=_supabase_credentials, table=TIMING_TABLE
+    )
+    atexit.register(storage.close)
+    return storage
+
+
+@st.cache_resource
+def init_timing_writer():
+    """
+    Background writer for trial_timing rows. They are diagnostics: failed
+    batches are counted, not spooled to the WAL or kept in memory.
+    """
+    return TrialWriter(
+        lambda rows: init_timing_storage().insert_many(rows),
+        batch_size=500, flush_interval=5.0, keep_failed=False,
+    )
+
+
+def record_commit(rows, queue_ms, commit_ms):
+    """
+    TrialWriter.on_commit: a trial_timing row per trial once the database
+    has acknowledged it, and the write lag as the "write_lag" phase
+    """
+    init_timing_writer().enqueue_many([
+        {"trial_key": row["trial_key"], "queue_ms": queued, "commit_ms": commit_ms, "batch_rows": len(rows)}
+        for row, queued in zip(rows, queue_ms)
+    ])
+    for row, queued in zip(rows, queue_ms):
+        METRICS.observe("write_lag", row["condition"], row["block"], queued + commit_ms)
+
+
+@st.cache_resource
+def init_wal_replayer():
+    """
+    On-disk log for rows that could not be written; drained on startup and on
+    recovery. One directory per worker process under ISM_WAL_DIR.
+    """
+    wal = open_worker_wal(os.environ.get("ISM_WAL_DIR", "trial_wal"))
+    return WalReplayer(wal, insert_trial_rows)
+
+
+@st.cache_resource
+def init_trial_writer():
+    """One background writer per server process, shared by all sessions"""
+    replayer = init_wal_replayer()
+    return TrialWriter(
+        insert_trial_rows, wal=replayer.wal, on_flush_ok=replayer.wake,
+        on_commit=record_commit if TRIAL_TIMING else None,
+    )
+
+
+@st.cache_resource
+def init_sheets_sink():
+    """
+    Optional live mirror of the trials in a Google Sheet, configured by a
+    [gsheets] table in secrets.toml (see sheets_sink.service_account_worksheet).
+    None when that table is absent.
+    """
+    try:
+        config = st.secrets.get("gsheets")
+    except FileNotFoundError:  # no secrets.toml at all, e.g. running offline
+        return None
+    if config is None:
+        return None
+    return SheetsSink(service_account_worksheet(config))
+
+
+@st.cache_resource
+def init_checkpoints():
+    """
+    Where each participant's Session is kept outside this process
+    (checkpoints.py): ISM_SESSION_STORE, "sqlite:<path>" or "files:<directory>"
+    """
+    return open_checkpoint_store(os.environ.get("ISM_SESSION_STORE", "sqlite:checkpoints.sqlite3"))
+
+
+def save_checkpoint(s):
+    """Rewrite the participant's resume point; a no-op before the experiment starts"""
+    if s.resume_token is None:
+        return
+    start = time.perf_counter()
+    init_checkpoints().save(s)
+    METRICS.observe("checkpoint", s.condition, s.block, (time.perf_counter() - start) * 1000)
+
+
+def get_or_resume_session():
+    """
+    get_session(), except that a new browser session whose URL carries
+    ?resume=<token> continues from that token's checkpoint, and a session
+    that another worker has advanced since is reloaded from the store
+    """
+    s = st.session_state.get(SESSION_KEY)
+    start = time.perf_counter()
+    if s is None:
+        token = st.query_params.get(RESUME_PARAM)
+        if token:
+            restored = init_checkpoints().load(token)
+            if restored is not None:
+                st.session_state[SESSION_KEY] = restored
+            else:
+                del st.query_params[RESUME_PARAM]  # unknown or expired: start over
+    elif s.resume_token is not None:
+        fresh = init_checkpoints().refresh(s)
+        if fresh is not None:
+            fresh.stylesheet_injected = s.stylesheet_injected  # same browser page
+            st.session_state[SESSION_KEY] = fresh
+    s = get_session()
+    METRICS.observe("session_sync", s.condition, s.block, (time.perf_counter() - start) * 1000)
+    return s
+
+
+@st.cache_resource
+def init_block_sweeper():
+    """
+    With ISM_TRIAL_WRITES=block, writes the rows of participants who left
+    mid-block after ISM_BLOCK_SWEEP_IDLE_SECONDS; None in per-trial mode
+    """
+    if TRIAL_WRITES != "block":
+        return None
+    return PendingRowSweeper(
+        init_checkpoints(), write_trial_rows,
+        idle_seconds=float(os.environ.get("ISM_BLOCK_SWEEP_IDLE_SECONDS", "600")),
+    ).start()
+
+
+@st.cache_resource
+def init_admission():
+    """
+    Cap on participants in the experiment at once in this process
+    (admission.py): ISM_MAX_ACTIVE, 0 for no cap.
+    """
+    return AdmissionController(
+        int(os.environ.get("ISM_MAX_ACTIVE", "40")),
+        idle_seconds=float(os.environ.get("ISM_ADMISSION_IDLE_SECONDS", "600")),
+    )
+
+
+@st.cache_resource
+def init_metrics():
+    """
+    Gauges for the shared writer, WAL and template caches, plus the exporters.
+    ISM_METRICS_PORT serves /metrics and /summary on localhost;
+    ISM_METRICS_FILE gets a JSON summary every ISM_METRICS_FLUSH_SECONDS.
+    """
+    METRICS.add_collector("writer", lambda: init_trial_writer().stats())
+    if TRIAL_TIMING:
+        METRICS.add_collector("timing_writer", lambda: init_timing_writer().stats())
+    METRICS.add_collector("storage", lambda: init_storage().health())
+    METRICS.add_collector("wal", lambda: init_wal_replayer().stats())
+    if init_sheets_sink() is not None:
+        METRICS.add_collector("sheets", lambda: init_sheets_sink().stats())
+    METRICS.add_collector("checkpoints", lambda: init_checkpoints().stats())
+    METRICS.add_collector("admission", lambda: init_admission().stats())
+    if init_block_sweeper() is not None:
+        METRICS.add_collector("block_sweeper", lambda: init_block_sweeper().stats())
+    METRICS.add_collector("banner_cache", lambda: {
+        f"{fn}_{k}": v for fn, info in cache_stats().items() for k, v in info.items()
+    })
+
+    port = os.environ.get("ISM_METRICS_PORT")
+    if port:
+        try:
+            METRICS.start_http_server(int(port))
+            print(f"Metrics on http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint not started: {e}")
+
+    path = os.environ.get("ISM_METRICS_FILE")
+    if path:
+        METRICS.start_file_flusher(path, float(os.environ.get("ISM_METRICS_FLUSH_SECONDS", "10")))
+    return METRICS
+
+
+def write_trial_rows(rows):
+    """Queue rows for the background Supabase writer (and the sheet mirror) - never waits on the network"""
+    init_trial_writer().enqueue_many(rows)
+    sheets = init_sheets_sink()
+    if sheets is not None:
+        for row in rows:
+            sheets.enqueue(row)
+
+
+def flush_block(s):
+    """Queue the rows held back for this block as one bulk insert (block mode)"""
+    if not s.pending_rows:
+        return
+    start = time.perf_counter()
+    rows = s.pending_rows
+    if s.resume_token is not None:
+        # Only the rows claimed here: any the block sweeper took while the
+        # participant was away have been written already
+        claimed = init_checkpoints().claim_pending(s.resume_token)
+        if claimed is not None:
+            rows = claimed
+    if rows:
+        write_trial_rows(rows)
+    s.pending_rows = []
+    METRICS.observe("flush_block", s.condition, s.block, (time.perf_counter() - start) * 1000)
+
+
+def log_trial(s):
+    """
+    Record one trial: queued for the database right away, or in block mode
+    held in the session (and next to its checkpoint) until flush_block()
+    """
+
+    row_data = {
+        # Deterministic per-trial key; unique index in migrations/001_experiment_data_trial_key.sql
+        "trial_key": f"{s.participant_id}:{s.block_index + 1}:{s.round}",
+        "participant_id": s.participant_id,
+        "order_name": s.order_name,  # For block order names
+        "block": s.block_index + 1,
+        "condition": s.condition,
+        "round": s.round,
+        "choice": s.last_choice,
+        "outcome": s.last_outcome,
+        "p_win": s.debug_p_win,
+        "win_streak": s.win_streak,
+        "loss_streak": s.loss_streak,
+        "balance": s.balance,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "rng_seed": s.rng_seed,  # replay.py rebuilds the session from this
+        "reaction_time_ms": s.reaction_time_ms,  # server-side: rerun + network included
+        "client_reaction_time_ms": s.client_reaction_time_ms,  # browser paint -> click
+    }
+    if TRIAL_TIMING:
+        # Server-side latency, monotonic clock (migrations/005_trial_timing.sql)
+        row_data.update({
+            "render_ms": _elapsed_ms(s.round_start_ns, s.render_ns) if s.timing_valid else None,  # round start -> buttons drawn
+            "callback_ms": _elapsed_ms(s.choice_entry_ns, s.choice_exit_ns),  # choice callback
+            "enqueue_ms": _elapsed_ms(s.continue_entry_ns, time.perf_counter_ns()),  # Continue click -> queued
+        })
+
+    start = time.perf_counter()
+    if TRIAL_WRITES == "block":
+        if s.resume_token is None or init_checkpoints().append_pending(s, [row_data]):
+            s.pending_rows.append(row_data)
+        else:
+            # Not kept next to the checkpoint, so flush_block() would not
+            # claim it: queue it now, as in per-trial mode
+            write_trial_rows([row_data])
+    else:
+        write_trial_rows([row_data])
+    METRICS.observe("log_trial", s.condition, s.block, (time.perf_counter() - start) * 1000)
+
+
+# ===== GAME CALLBACKS =====
+def _elapsed_ms(start_ns, end_ns):
+    """Milliseconds between two time.perf_counter_ns() stamps, None if either is missing"""
+    if start_ns is None or end_ns is None:
+        return None
+    return (end_ns - start_ns) / 1e6
+
+
+def _record_reaction_time(s, client_rt_ms, entry_ns):
+    # Monotonic clock: an NTP step or slew during the round cannot shift the RT
+    s.choice_entry_ns = entry_ns
+    s.reaction_time_ms = _elapsed_ms(s.round_start_ns, entry_ns) if s.timing_valid else None
+    s.client_reaction_time_ms = client_rt_ms
+
+
+def start_round(s):
+    """Start the round timer and clear the previous round's latency stamps"""
+    s.round_start_ns = time.perf_counter_ns()
+    s.timing_valid = True
+    s.render_ns = s.choice_entry_ns = s.choice_exit_ns = s.continue_entry_ns = None
+
+
+def choose_safe(client_rt_ms=None):
+    entry_ns = time.perf_counter_ns()
+    s = get_or_resume_session()  # a newer copy saved elsewhere (another worker, the block sweeper) wins
+    if s.awaiting_feedback:  # ignore double clicks
+        return
+    start = time.perf_counter()
+    s.balance += 1
+    s.awaiting_feedback = True
+    s.last_choice = "safe"
+    s.last_outcome = "safe"
+
+    _record_reaction_time(s, client_rt_ms, entry_ns)
+    METRICS.observe("choice", s.condition, s.block, (time.perf_counter() - start) * 1000)
+    save_checkpoint(s)  # a reload now shows this choice's feedback instead of offering it again
+    s.choice_exit_ns = time.perf_counter_ns()
+
+
+def choose_risk(client_rt_ms=None):
+    entry_ns = time.perf_counter_ns()
+    s = get_or_resume_session()
+    if s.awaiting_feedback:  # ignore double clicks
+        return
+    start = time.perf_counter()
+    outcome, p_win = biased_risk_outcome(
+        s.win_streak, s.loss_streak, s.bias_rounds_left, s.bias_rounds_active, rng=s.outcome_rng
+    )
+    s.outcome_draws += 1
+
+    s.debug_p_win = p_win
+    s.last_choice = "risk"
+
+    # decrement bias window only if active
+    s.bias_rounds_left, s.bias_rounds_active = consume_bias_round(s.bias_rounds_left, s.bias_rounds_active)
+
+    if outcome == 1:
+        s.balance += 4  # Win
+    else:
+        s.balance -= 2  # Loss
+    s.awaiting_feedback = True
+    s.last_outcome = "win" if outcome == 1 else "loss"
+
+    _record_reaction_time(s, client_rt_ms, entry_ns)
+    METRICS.observe("choice", s.condition, s.block, (time.perf_counter() - start) * 1000)
+    save_checkpoint(s)  # a reload must not allow a second draw for this round
+    s.choice_exit_ns = time.perf_counter_ns()
+
+
+def continue_after_feedback():
+    entry_ns = time.perf_counter_ns()
+    s = get_or_resume_session()
+    # A second click on a stale "Continue" button must not log the round again
+    if not s.awaiting_feedback:
+        return
+    s.continue_entry_ns = entry_ns  # not the choice: the feedback screen in between is the participant's time
+    start = time.perf_counter()
+    condition, block = s.condition, s.block
+
+    # Clear animation flag FIRST before any other updates
+    s.animation_shown = False
+
+    # Update streaks based on last outcome (opens the bias window on a 3-streak)
+    s.win_streak, s.loss_streak, s.bias_rounds_left, s.bias_rounds_active = update_streaks(
+        s.last_outcome, s.win_streak, s.loss_streak, s.bias_rounds_left, s.bias_rounds_active
+    )
+    if s.last_outcome in ("win", "loss"):
+        s.last_risk_outcome = s.last_outcome
+
+    log_trial(s)  # enqueue only, written in the background
+
+    # Advance round
+    s.round += 1
+
+    # Clear feedback state
+    s.awaiting_feedback = False
+    s.last_outcome = None
+
+    # Reset round timer for next round
+    start_round(s)
+
+    # Enter break exactly once at round limit
+    if s.round >= ROUNDS_PER_BLOCK:
+        flush_block(s)  # the participant is idle on the break screen while it is written
+        s.in_break = True
+        # Clear all feedback state when entering break
+        s.awaiting_feedback = False
+        s.last_outcome = None
+        s.last_choice = None
+
+    METRICS.observe("continue", condition, block, (time.perf_counter() - start) * 1000)
+    save_checkpoint(s)
+
+
+def update_condition_from_block(s):
+    s.condition = s.block_order[s.block_index]
+
+
+def start_experiment():
+    s = get_or_resume_session()
+    if not init_admission().try_admit(s.participant_id):
+        if s.queued_at is None:
+            s.queued_at = time.monotonic()
+        return  # app.py shows the waiting room, which calls this again once there is a slot
+    if s.queued_at is not None:
+        METRICS.observe("admission_wait", "none", s.block, (time.monotonic() - s.queued_at) * 1000)
+        s.queued_at = None
+
+    s.started = True
+    s.block = 1
+    s.block_index = 0  # Start at first randomized block
+    update_condition_from_block(s)
+
+    # From here on the URL resumes this participant after a reload or server restart
+    s.resume_token = new_token()
+    init_checkpoints().create(s)
+    st.query_params[RESUME_PARAM] = s.resume_token
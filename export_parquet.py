@@ -0,0 +1,214 @@
+"""
+Incremental export of experiment_data to partitioned Parquet.
+
+Pages through the table in (inserted_at, trial_key) order starting after
+the watermark saved by the previous run, and writes only the new rows:
+
+    export/
+        _watermark.json
+        date=2026-10-18/order_name=Order1_NVAD/part-<id>.parquet
+        ...
+
+date is the trial's own UTC date. condition, choice and outcome are
+dictionary-encoded (order_name is a partition key). The directory reads as
+one dataset with pandas/pyarrow and can be passed straight to replay.py.
+
+    python export_parquet.py export/
+    python export_parquet.py export/ --secrets .streamlit/secrets.toml --page-size 1000
+
+Every column of SCHEMA is selected, so the table needs migrations 001-005:
+trial_key (001), client_reaction_time_ms (002), rng_seed (003), the
+inserted_at watermark (004) and render_ms/callback_ms/enqueue_ms (005). A
+database missing one of them fails the export. Credentials come from
+SUPABASE_URL / SUPABASE_KEY or the [supabase] table of the secrets file.
+Rows are only exported once they are --settle-seconds old, so transactions
+still in flight when the run starts are picked up by the next run instead
+of being skipped by the watermark.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import tomllib
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+WATERMARK_FILE = "_watermark.json"
+
+SCHEMA = pa.schema([
+    ("trial_key", pa.string()),
+    ("participant_id", pa.string()),
+    ("order_name", pa.string()),
+    ("block", pa.int16()),
+    ("condition", pa.string()),
+    ("round", pa.int16()),
+    ("choice", pa.string()),
+    ("outcome", pa.string()),
+    ("p_win", pa.float64()),
+    ("win_streak", pa.int16()),
+    ("loss_streak", pa.int16()),
+    ("balance", pa.int32()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("rng_seed", pa.int64()),
+    ("reaction_time_ms", pa.float64()),
+    ("client_reaction_time_ms", pa.float64()),
+    ("render_ms", pa.float64()),
+    ("callback_ms", pa.float64()),
+    ("enqueue_ms", pa.float64()),
+    ("inserted_at", pa.timestamp("us", tz="UTC")),
+])
+
+DICTIONARY_COLUMNS = ["condition", "choice", "outcome", "order_name"]
+TIMESTAMP_COLUMNS = ["timestamp", "inserted_at"]
+
+
+# ===== SOURCE =====
+def load_credentials(secrets_path):
+    url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+    if url and key:
+        return url, key
+    with open(secrets_path, "rb") as f:
+        secrets = tomllib.load(f)["supabase"]
+    return secrets["url"], secrets["key"]
+
+
+def _quote(value):
+    # PostgREST logic trees need values with reserved characters (":", ",", ".") quoted
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def fetch_page(client, after, cutoff, limit):
+    """Up to limit rows with (inserted_at, trial_key) > after and inserted_at <= cutoff, in key order"""
+    query = client.table("experiment_data").select(",".join(SCHEMA.names)).lte("inserted_at", cutoff)
+    if after is not None:
+        ts, key = after
+        query = query.or_(f"inserted_at.gt.{_quote(ts)},and(inserted_at.eq.{_quote(ts)},trial_key.gt.{_quote(key)})")
+    return query.order("inserted_at").order("trial_key").limit(limit).execute().data
+
+
+# ===== WATERMARK =====
+def read_watermark(out_dir):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_watermark(out_dir, watermark):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(watermark, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+# ===== PARQUET =====
+def rows_to_table(rows):
+    columns = {}
+    for field in SCHEMA:
+        values = [row.get(field.name) for row in rows]
+        if field.name in TIMESTAMP_COLUMNS:
+            columns[field.name] = pa.array(values, pa.string()).cast(field.type)
+        else:
+            columns[field.name] = pa.array(values, field.type)
+    return pa.table(columns, schema=SCHEMA)
+
+
+def write_partitions(table, out_dir, part_id):
+    """
+    One file per (date, order_name) in this batch. part_id is derived from
+    the batch's starting watermark, so a run that crashes before saving the
+    watermark rewrites the same files instead of duplicating rows.
+    """
+    dates = pc.strftime(pc.coalesce(table["timestamp"], table["inserted_at"]), format="%Y-%m-%d")
+    orders = pc.fill_null(table["order_name"], "Unknown")
+    keys = pc.binary_join_element_wise(dates, orders, "\x00")
+
+    written = 0
+    for key in pc.unique(keys).to_pylist():
+        date, order_name = key.split("\x00")
+        part = table.filter(pc.equal(keys, key)).drop_columns(["order_name"])
+        directory = os.path.join(out_dir, f"date={date}", f"order_name={order_name}")
+        os.makedirs(directory, exist_ok=True)
+        pq.write_table(
+            part,
+            os.path.join(directory, f"part-{part_id}.parquet"),
+            use_dictionary=DICTIONARY_COLUMNS,
+            compression="zstd",
+        )
+        written += 1
+    return written
+
+
+# ===== EXPORT =====
+def export(client, out_dir, page_size=1000, flush_rows=50000, settle_seconds=60):
+    os.makedirs(out_dir, exist_ok=True)
+    watermark = read_watermark(out_dir) or {"inserted_at": None, "trial_key": None, "rows_exported": 0}
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)).isoformat()
+
+    stats = {"rows": 0, "pages": 0, "files": 0, "started_after": watermark["inserted_at"], "cutoff": cutoff}
+    batch = []
+    batch_start = watermark.copy()
+
+    def flush():
+        nonlocal batch, batch_start
+        if not batch:
+            return
+        part_id = hashlib.sha1(f"{batch_start['inserted_at']}|{batch_start['trial_key']}".encode()).hexdigest()[:16]
+        stats["files"] += write_partitions(rows_to_table(batch), out_dir, part_id)
+        last = batch[-1]
+        watermark.update(
+            inserted_at=last["inserted_at"],
+            trial_key=last["trial_key"],
+            rows_exported=watermark["rows_exported"] + len(batch),
+            updated_at=datetime.now(timezone.utc).isoformat(),
+        )
+        write_watermark(out_dir, watermark)
+        batch = []
+        batch_start = watermark.copy()
+
+    after = (watermark["inserted_at"], watermark["trial_key"]) if watermark["inserted_at"] else None
+    while True:
+        page = fetch_page(client, after, cutoff, page_size)
+        stats["pages"] += 1
+        if page:
+            after = (page[-1]["inserted_at"], page[-1]["trial_key"])
+        batch.extend(page)
+        stats["rows"] += len(page)
+        if len(batch) >= flush_rows:
+            flush()
+        # Only an empty page ends the export: PostgREST's max-rows can cap
+        # every page below page_size, so a short page is not the last one
+        if not page:
+            break
+    flush()
+
+    stats["watermark"] = {"inserted_at": watermark["inserted_at"], "trial_key": watermark["trial_key"]}
+    stats["rows_exported_total"] = watermark["rows_exported"]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir", help="dataset directory (created on the first run)")
+    parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"))
+    parser.add_argument("--page-size", type=int, default=1000, help="rows asked for per request (the server's max-rows may return fewer)")
+    parser.add_argument("--flush-rows", type=int, default=50000, help="rows per written batch of files")
+    parser.add_argument("--settle-seconds", type=int, default=60)
+    args = parser.parse_args()
+
+    from supabase import create_client
+
+    client = create_client(*load_credentials(args.secrets))
+    start = time.perf_counter()
+    stats = export(client, args.out_dir, args.page_size, args.flush_rows, args.settle_seconds)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import random
+import secrets
+
+# Game rules shared by app.py and the offline tools (simulate.py, replay.py)
+START_BALANCE = 20
+ROUNDS_PER_BLOCK = 30
+BLOCKS = 4
+
+SAFE_PAYOFF = 1
+WIN_PAYOFF = 4
+LOSS_PAYOFF = -2
+
+STREAK_TRIGGER = 3   # a streak of this length opens the bias window
+BIAS_WINDOW = 3      # number of risky draws the window lasts
+
+# p_win during the bias window, keyed by bias_rounds_left
+WIN_STREAK_P = {3: 0.75, 2: 0.80, 1: 0.85}   # 4th, 5th, 6th outcome of a win streak
+LOSS_STREAK_P = {3: 0.25, 2: 0.20, 1: 0.15}  # 4th, 5th, 6th outcome of a loss streak
+
+
+def new_session_seed():
+    """Per-participant seed, logged with every trial (48 bits: exact in JSON and JS)"""
+    return secrets.randbits(48)
+
+
+def session_rng(seed, stream="outcome"):
+    """
+    Independent generator per participant and purpose. Risky outcomes get
+    their own stream so that exactly one draw is used per risky choice,
+    which is what replay.py relies on; block order and feedback messages
+    use separate streams derived from the same seed.
+    """
+    if stream == "outcome":
+        return random.Random(seed)
+    return random.Random(f"{seed}:{stream}")
+
+
+def risk_p_win(win_streak, loss_streak, bias_rounds_left, bias_rounds_active):
+    """
+    Probability that the next risky choice wins.
+
+    Streaks 1-3: fair 0.5 probability
+    After 3-streak: cluster bias is active for exactly 3 rounds based on bias_rounds_left
+    Then returns back to 0.5
+    """
+    p_win = 0.5
+
+    # only apply bias if active (during the 3-round bias window)
+    if bias_rounds_left > 0 and bias_rounds_active:
+        if win_streak >= STREAK_TRIGGER:
+            p_win = WIN_STREAK_P.get(bias_rounds_left, p_win)
+        if loss_streak >= STREAK_TRIGGER:
+            p_win = LOSS_STREAK_P.get(bias_rounds_left, p_win)
+
+    return p_win
+
+
+def biased_risk_outcome(win_streak, loss_streak, bias_rounds_left, bias_rounds_active, rng=random):
+    """Returns (outcome, p_win); outcome is 1 for a win, -1 for a loss"""
+    p_win = risk_p_win(win_streak, loss_streak, bias_rounds_left, bias_rounds_active)
+    outcome = 1 if rng.random() < p_win else -1
+    return outcome, p_win
+
+
+def consume_bias_round(bias_rounds_left, bias_rounds_active):
+    """A risky draw uses up one round of the bias window. Returns (left, active)."""
+    if bias_rounds_left > 0:
+        bias_rounds_left -= 1
+        if bias_rounds_left == 0:
+            bias_rounds_active = False
+    return bias_rounds_left, bias_rounds_active
+
+
+def update_streaks(last_outcome, win_streak, loss_streak, bias_rounds_left, bias_rounds_active):
+    """
+    Streak bookkeeping after feedback ("safe" leaves streaks untouched).
+    Returns (win_streak, loss_streak, bias_rounds_left, bias_rounds_active).
+    """
+    if last_outcome == "win":
+        win_streak += 1
+        loss_streak = 0
+        if win_streak == STREAK_TRIGGER and not bias_rounds_active:
+            bias_rounds_left = BIAS_WINDOW
+            bias_rounds_active = True
+
+    elif last_outcome == "loss":
+        loss_streak += 1
+        win_streak = 0
+        if loss_streak == STREAK_TRIGGER and not bias_rounds_active:
+            bias_rounds_left = BIAS_WINDOW
+            bias_rounds_active = True
+
+    return win_streak, loss_streak, bias_rounds_left, bias_rounds_active
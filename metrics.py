@@ -0,0 +1,212 @@
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Phase timers for each rerun, aggregated in process.
+#
+# Every observation lands in a fixed-bucket histogram keyed by
+# (phase, condition, block): one lock, one bisect and three additions, so it
+# is cheap enough to leave on while a study runs. The histograms and any
+# registered gauges (writer queue, WAL backlog, template cache) are served as
+# Prometheus text and/or written to a JSON file every few seconds.
+
+# Upper bounds in milliseconds; the last bucket is +Inf
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 15000)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.count += 1
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.total += other.total
+        self.count += other.count
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating linearly inside one (as Prometheus does)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lower = BUCKETS_MS[i - 1] if i > 0 else 0.0
+                if i == len(BUCKETS_MS):  # +Inf bucket: best we can say is the last bound
+                    return BUCKETS_MS[-1]
+                return lower + (BUCKETS_MS[i] - lower) * (rank - seen) / c
+            seen += c
+        return BUCKETS_MS[-1]
+
+
+class Metrics:
+    """
+    Process-wide phase timings and gauges.
+
+    observe(phase, condition, block, ms) records one timing.
+    add_collector(name, fn) registers fn() -> dict of numbers, read on export.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hists = {}
+        self._collectors = {}
+        self.started_at = time.time()
+
+    def observe(self, phase, condition, block, ms):
+        key = (phase, condition, block)
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram()
+            hist.observe(ms)
+
+    def timer(self, phase, condition, block):
+        return _Timer(self, phase, condition, block)
+
+    def add_collector(self, name, fn):
+        self._collectors[name] = fn
+
+    def _copy(self):
+        with self._lock:
+            copies = {}
+            for key, hist in self._hists.items():
+                copy = Histogram()
+                copy.merge(hist)
+                copies[key] = copy
+            return copies
+
+    def _gauges(self):
+        gauges = {}
+        for name, fn in self._collectors.items():
+            try:
+                values = fn()
+            except Exception as e:
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    gauges[f"{name}_{key}"] = value
+        return gauges
+
+    def summary(self):
+        """Count, mean and quantiles per (phase, condition), blocks merged; plus gauges"""
+        merged = {}
+        for (phase, condition, _block), hist in self._copy().items():
+            merged.setdefault((phase, condition), Histogram()).merge(hist)
+
+        phases = {}
+        for (phase, condition), hist in sorted(merged.items()):
+            entry = {"count": hist.count, "mean_ms": hist.total / hist.count}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}_ms"] = hist.quantile(q)
+            phases.setdefault(phase, {})[condition] = entry
+
+        return {
+            "uptime_s": time.time() - self.started_at,
+            "phases": phases,
+            "gauges": self._gauges(),
+        }
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP ism_phase_duration_ms Time spent in each phase of a rerun or callback",
+            "# TYPE ism_phase_duration_ms histogram",
+        ]
+        for (phase, condition, block), hist in sorted(self._copy().items(), key=lambda kv: str(kv[0])):
+            labels = f'phase="{phase}",condition="{condition}",block="{block}"'
+            cumulative = 0
+            for bound, c in zip(BUCKETS_MS, hist.counts):
+                cumulative += c
+                lines.append(f'ism_phase_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'ism_phase_duration_ms_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f"ism_phase_duration_ms_sum{{{labels}}} {hist.total}")
+            lines.append(f"ism_phase_duration_ms_count{{{labels}}} {hist.count}")
+
+        for name, value in sorted(self._gauges().items()):
+            lines.append(f"# TYPE ism_{name} gauge")
+            lines.append(f"ism_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """Serve /metrics (Prometheus text) and /summary (JSON) from a daemon thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.prometheus_text().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/summary":
+                    body = json.dumps(metrics.summary(), indent=2).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def start_file_flusher(self, path, interval=10.0):
+        """Rewrite path with summary() every interval seconds (atomic rename)"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    tmp = f"{path}.tmp"
+                    with open(tmp, "w") as f:
+                        json.dump(self.summary(), f, indent=2)
+                    os.replace(tmp, path)
+                except Exception as e:
+                    print(f"Metrics flush failed: {e}")
+
+        thread = threading.Thread(target=run, name="metrics-flush", daemon=True)
+        thread.start()
+        return thread
+
+
+class _Timer:
+    __slots__ = ("metrics", "labels", "start")
+
+    def __init__(self, metrics, phase, condition, block):
+        self.metrics = metrics
+        self.labels = (phase, condition, block)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(*self.labels, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+# One registry per server process (this module is imported once)
+METRICS = Metrics()
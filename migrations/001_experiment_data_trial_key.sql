@@ -0,0 +1,26 @@
+-- Idempotent trial writes: one row per (participant_id, block, round).
+--
+-- The app writes trial_key = '<participant_id>:<block>:<round>' and upserts
+-- with ON CONFLICT (trial_key) DO NOTHING, so retries, WAL replay and double
+-- clicks can never create a second row for the same trial.
+--
+-- Run steps 1-3 in one transaction (SQL editor), then step 4 on its own:
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+
+-- 1. New column
+alter table experiment_data add column if not exists trial_key text;
+
+-- 2. Backfill existing rows
+update experiment_data
+set trial_key = participant_id || ':' || block || ':' || round
+where trial_key is null;
+
+-- 3. Remove duplicates already in the table, keeping the first physical row
+delete from experiment_data a
+using experiment_data b
+where a.trial_key = b.trial_key
+  and a.ctid > b.ctid;
+
+-- 4. Unique index used by the upsert (does not lock out inserts while building)
+create unique index concurrently if not exists experiment_data_trial_key_idx
+    on experiment_data (trial_key);
@@ -0,0 +1,5 @@
+-- Browser-measured reaction time (performance.now() from button paint to click).
+-- reaction_time_ms keeps the server-side measurement, which includes websocket
+-- latency and rerun/render time; the difference shows how much server load
+-- distorts the RT data.
+alter table experiment_data add column if not exists client_reaction_time_ms double precision;
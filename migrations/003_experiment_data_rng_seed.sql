@@ -0,0 +1,5 @@
+-- Per-participant RNG seed. Together with the logged choices it lets
+-- replay.py rebuild every outcome, p_win, streak and balance of a session.
+-- Rows written before this column existed keep NULL and are reported as
+-- "no_seed" by the replay tool.
+alter table experiment_data add column if not exists rng_seed bigint;
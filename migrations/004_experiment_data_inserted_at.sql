@@ -0,0 +1,23 @@
+-- Server-side insert time, used by export_parquet.py as its watermark.
+--
+-- The app's own "timestamp" is stamped when the participant clicks; rows can
+-- reach the table much later (writer retries, WAL replay after an outage), so
+-- an export that pages by "timestamp" would skip them. inserted_at is set by
+-- the database when the row lands.
+--
+-- Run steps 1-2 in one transaction, then step 3 on its own
+-- (CREATE INDEX CONCURRENTLY cannot run inside a transaction block).
+
+-- 1. New column; existing rows get their trial timestamp
+alter table experiment_data add column if not exists inserted_at timestamptz;
+
+update experiment_data
+set inserted_at = "timestamp"::timestamptz
+where inserted_at is null;
+
+-- 2. New rows are stamped by the database
+alter table experiment_data alter column inserted_at set default now();
+
+-- 3. Keyset paging for the exporter: where (inserted_at, trial_key) > watermark order by both
+create index concurrently if not exists experiment_data_inserted_at_idx
+    on experiment_data (inserted_at, trial_key);
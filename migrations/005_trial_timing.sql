@@ -0,0 +1,43 @@
+-- Where the time of a trial went, from the server's monotonic clock
+-- (time.perf_counter_ns, immune to NTP adjustments of the wall clock).
+--
+-- The app writes these columns and the trial_timing table only with
+-- ISM_TRIAL_TIMING=1. Apply this migration before turning that on: the
+-- inserts fail against a database without it.
+--
+-- reaction_time_ms is now measured on that clock too: from the start of the
+-- round (the Continue click, or the end of the break) to the choice callback.
+-- The new experiment_data columns split the server's share out of it:
+--
+--   render_ms     round start -> choice buttons first sent to the browser
+--                 (rest of the Continue callback + the rerun drawing the round)
+--   callback_ms   choice callback entry -> exit (outcome draw + checkpoint)
+--   enqueue_ms    Continue callback entry -> row queued for the database
+--                 (the time on the feedback screen is not in it; with
+--                 ISM_TRIAL_WRITES=block, up to the point the row joins the
+--                 block's pending rows)
+--
+-- so reaction_time_ms - render_ms is the participant plus the click's trip
+-- back, and client_reaction_time_ms the participant alone. A round that
+-- started in another process (the participant resumed, or another worker
+-- moved the session on) has no start on this clock: its reaction_time_ms
+-- and render_ms are NULL, as is any stamp of the round taken elsewhere.
+alter table experiment_data add column if not exists render_ms double precision;
+alter table experiment_data add column if not exists callback_ms double precision;
+alter table experiment_data add column if not exists enqueue_ms double precision;
+
+-- The database acknowledgement comes after the trial row is written, so it
+-- goes in a table of its own, one row per trial written by the app's
+-- background writer (trials that went through the WAL after an outage have
+-- none; inserted_at - "timestamp" covers them):
+--
+--   queue_ms      row queued -> its bulk insert sent
+--   commit_ms     bulk insert sent -> acknowledged (same for the whole batch)
+--   batch_rows    rows in that insert
+create table if not exists trial_timing (
+    trial_key text primary key,
+    queue_ms double precision,
+    commit_ms double precision,
+    batch_rows integer,
+    inserted_at timestamptz not null default now()
+);
@@ -0,0 +1,186 @@
+"""
+Deterministic replay of logged sessions.
+
+Every trial row carries the participant's rng_seed. Given the logged
+choices, the outcome stream (one draw per risky choice) and game.py rebuild
+each session's outcomes, p_win, streaks and balances; the rebuilt values
+are checked against what was logged.
+
+    python replay.py experiment_data.parquet
+    python replay.py export/ --mismatches mismatches.csv --rebuilt rebuilt.parquet
+
+Input is a Parquet file or directory, a CSV, or a JSONL export of
+experiment_data.
+"""
+import argparse
+import json
+import math
+import os
+import time
+
+import pandas as pd
+
+import game
+
+COLUMNS = [
+    "participant_id", "rng_seed", "block", "round", "choice",
+    "outcome", "p_win", "win_streak", "loss_streak", "balance",
+]
+
+VERIFIED = "verified"
+MISMATCH = "mismatch"
+INCOMPLETE = "incomplete"   # a trial is missing, so later draws cannot be aligned
+NO_SEED = "no_seed"         # logged before per-participant seeds existed
+
+
+def load_trials(path):
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=COLUMNS)
+    elif path.endswith(".csv"):
+        df = pd.read_csv(path, usecols=COLUMNS)
+    else:
+        df = pd.read_json(path, lines=True)[COLUMNS]
+    # A session's rows in play order; duplicates from before idempotent writes are dropped
+    df = df.drop_duplicates(["participant_id", "block", "round"])
+    return df.sort_values(["participant_id", "block", "round"], kind="stable").reset_index(drop=True)
+
+
+def replay_session(seed, blocks, rounds, choices):
+    """
+    Rebuild one session from its choices.
+    Returns (status, rebuilt) where rebuilt holds one list per logged field,
+    covering the trials up to the first gap.
+    """
+    rng = game.session_rng(seed, "outcome")
+    rebuilt = {"outcome": [], "p_win": [], "win_streak": [], "loss_streak": [], "balance": []}
+
+    expected_block, expected_round = 1, 0
+    win_streak = loss_streak = bias_left = 0
+    bias_active = False
+    balance = game.START_BALANCE
+    p_win = None
+
+    for block, rnd, choice in zip(blocks, rounds, choices):
+        if block != expected_block or rnd != expected_round:
+            if rnd == 0 and block == expected_block + 1 and expected_round == game.ROUNDS_PER_BLOCK:
+                # New block: balance, streaks and bias reset; the outcome stream continues
+                expected_block = block
+                win_streak = loss_streak = bias_left = 0
+                bias_active = False
+                balance = game.START_BALANCE
+            else:
+                return INCOMPLETE, rebuilt
+
+        if choice == "risk":
+            outcome, p_win = game.biased_risk_outcome(win_streak, loss_streak, bias_left, bias_active, rng=rng)
+            bias_left, bias_active = game.consume_bias_round(bias_left, bias_active)
+            if outcome == 1:
+                balance += game.WIN_PAYOFF
+                last = "win"
+            else:
+                balance += game.LOSS_PAYOFF
+                last = "loss"
+        else:
+            balance += game.SAFE_PAYOFF
+            last = "safe"
+
+        win_streak, loss_streak, bias_left, bias_active = game.update_streaks(
+            last, win_streak, loss_streak, bias_left, bias_active
+        )
+
+        # Same values log_trial() writes (p_win is the last risky draw's, as in the app)
+        rebuilt["outcome"].append(last)
+        rebuilt["p_win"].append(p_win)
+        rebuilt["win_streak"].append(win_streak)
+        rebuilt["loss_streak"].append(loss_streak)
+        rebuilt["balance"].append(balance)
+        expected_round = rnd + 1
+
+    return VERIFIED, rebuilt
+
+
+def _same(logged, replayed, field):
+    if field == "p_win":
+        if replayed is None:
+            return logged is None or (isinstance(logged, float) and math.isnan(logged))
+        return logged is not None and abs(logged - replayed) < 1e-9
+    return logged == replayed
+
+
+def replay_all(df):
+    """Replay every session in df (sorted by load_trials). Returns (summary, mismatches, rebuilt columns)."""
+    pid = df["participant_id"].tolist()
+    seeds = df["rng_seed"].tolist()
+    blocks = df["block"].astype(int).tolist()
+    rounds = df["round"].astype(int).tolist()
+    choices = df["choice"].tolist()
+    logged = {f: df[f].tolist() for f in ("outcome", "p_win", "win_streak", "loss_streak", "balance")}
+
+    counts = {VERIFIED: 0, MISMATCH: 0, INCOMPLETE: 0, NO_SEED: 0}
+    mismatches = []
+    rebuilt_cols = {f: [None] * len(df) for f in logged}
+    status_col = [None] * len(df)
+
+    start = 0
+    while start < len(df):
+        end = start
+        while end < len(df) and pid[end] == pid[start]:
+            end += 1
+
+        seed = seeds[start]
+        if seed is None or (isinstance(seed, float) and math.isnan(seed)):
+            status = NO_SEED
+        else:
+            status, rebuilt = replay_session(int(seed), blocks[start:end], rounds[start:end], choices[start:end])
+            for field, values in rebuilt.items():
+                for i, value in enumerate(values):
+                    row = start + i
+                    rebuilt_cols[field][row] = value
+                    if not _same(logged[field][row], value, field):
+                        # p_win on safe trials is a leftover from the last risky draw; only risky ones count
+                        if field == "p_win" and choices[row] != "risk":
+                            continue
+                        mismatches.append({
+                            "participant_id": pid[row], "block": blocks[row], "round": rounds[row],
+                            "field": field, "logged": logged[field][row], "replayed": value,
+                        })
+                        if status == VERIFIED:
+                            status = MISMATCH
+
+        counts[status] += 1
+        status_col[start:end] = [status] * (end - start)
+        start = end
+
+    rebuilt_cols["replay_status"] = status_col
+    summary = {"sessions": sum(counts.values()), "trials": len(df), **counts}
+    return summary, mismatches, rebuilt_cols
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Parquet file/directory, CSV or JSONL export of experiment_data")
+    parser.add_argument("--mismatches", default=None, help="write every differing field to this CSV")
+    parser.add_argument("--rebuilt", default=None, help="write the rebuilt columns to this Parquet file")
+    args = parser.parse_args()
+
+    df = load_trials(args.path)
+    start = time.perf_counter()
+    summary, mismatches, rebuilt = replay_all(df)
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = round(elapsed, 3)
+    summary["sessions_per_second"] = round(summary["sessions"] / elapsed) if elapsed else None
+
+    if args.mismatches:
+        pd.DataFrame(mismatches, columns=["participant_id", "block", "round", "field", "logged", "replayed"]) \
+            .to_csv(args.mismatches, index=False)
+    if args.rebuilt:
+        out = df[["participant_id", "block", "round", "choice"]].copy()
+        for field, values in rebuilt.items():
+            out[f"replayed_{field}" if field != "replay_status" else field] = values
+        out.to_parquet(args.rebuilt, index=False)
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
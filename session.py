@@ -0,0 +1,126 @@
+import time
+import uuid
+
+import streamlit as st
+
+from game import START_BALANCE, new_session_seed, session_rng
+
+# All per-participant state lives in one slotted object stored under a single
+# session_state key. It is created once per session; after that every rerun
+# and callback reads plain attributes instead of going through session_state
+# for each field.
+
+SESSION_KEY = "session"
+
+# Fixed block orders for counterbalancing (25% chance each)
+BLOCK_ORDERS = [
+    ["neutral", "visual", "affective", "de-salience"],      # Order 1 (NVAD)
+    ["visual", "de-salience", "neutral", "affective"],      # Order 2 (VDNA)
+    ["affective", "neutral", "de-salience", "visual"],      # Order 3 (ANDV)
+    ["de-salience", "affective", "visual", "neutral"]       # Order 4 (DAVN)
+]
+
+# Order names for easy analysis
+ORDER_NAMES = {
+    "neutral-visual-affective-de-salience": "Order1_NVAD",
+    "visual-de-salience-neutral-affective": "Order2_VDNA",
+    "affective-neutral-de-salience-visual": "Order3_ANDV",
+    "de-salience-affective-visual-neutral": "Order4_DAVN"
+}
+
+
+class Session:
+    """One participant's experiment state"""
+
+    __slots__ = (
+        # participant
+        "participant_id", "rng_seed", "outcome_rng", "message_rng", "block_order", "order_name",
+        # block cursor
+        "started", "block", "block_index", "round", "condition", "in_break",
+        # balance, streak and bias state
+        "balance", "win_streak", "loss_streak", "bias_rounds_left", "bias_rounds_active",
+        "last_risk_outcome", "last_outcome", "last_choice", "awaiting_feedback", "debug_p_win",
+        # timing
+        "round_start_ns", "timing_valid", "render_ns", "choice_entry_ns", "choice_exit_ns", "continue_entry_ns",
+        "break_start_time", "reaction_time_ms", "client_reaction_time_ms",
+        # page
+        "animation_shown", "stylesheet_injected",
+        # resume (checkpoints.py)
+        "resume_token", "outcome_draws", "checkpoint_version",
+        # admission (admission.py)
+        "queued_at",
+        # block-level writes (block_writes.py)
+        "pending_rows",
+    )
+
+    def __init__(self, rng_seed=None, block_order=None):
+        self.participant_id = str(uuid.uuid4())
+
+        # Each participant gets their own generators instead of the shared global random
+        self.rng_seed = new_session_seed() if rng_seed is None else rng_seed
+        self.outcome_rng = session_rng(self.rng_seed, "outcome")
+        self.message_rng = session_rng(self.rng_seed, "message")
+
+        # Randomly assign one of the four orders
+        if block_order is None:
+            block_order = session_rng(self.rng_seed, "order").choice(BLOCK_ORDERS)
+        self.block_order = block_order
+        self.order_name = ORDER_NAMES.get("-".join(block_order), "Unknown")
+
+        self.started = False
+        self.block = 0
+        self.block_index = 0
+        self.round = 0
+        self.condition = "neutral"
+        self.in_break = False
+
+        self.balance = START_BALANCE
+        self.win_streak = 0
+        self.loss_streak = 0
+        self.bias_rounds_left = 0
+        self.bias_rounds_active = False
+        self.last_risk_outcome = None
+        self.last_outcome = None
+        self.last_choice = None
+        self.awaiting_feedback = False
+        self.debug_p_win = None
+
+        # time.perf_counter_ns() stamps of the current round, for reaction_time_ms and
+        # the latency columns of its trial row; meaningful only within this process
+        self.round_start_ns = time.perf_counter_ns()
+        self.timing_valid = True  # False when the round started in another process
+        self.render_ns = None  # choice buttons first drawn
+        self.choice_entry_ns = None  # choice callback entered
+        self.choice_exit_ns = None  # choice callback returned
+        self.continue_entry_ns = None  # Continue callback entered
+        self.break_start_time = None
+        self.reaction_time_ms = None
+        self.client_reaction_time_ms = None
+
+        self.animation_shown = False
+        self.stylesheet_injected = False
+
+        self.resume_token = None
+        self.outcome_draws = 0  # risky draws taken from outcome_rng so far
+        self.checkpoint_version = 0  # of the last checkpoint saved or loaded
+
+        self.queued_at = None  # time.monotonic() when the participant started waiting for a slot
+
+        self.pending_rows = []  # this block's trial rows not yet queued for the database
+
+    def snapshot(self):
+        """Plain dict of every field except the generators, for logging and debugging"""
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if name not in ("outcome_rng", "message_rng")
+        }
+
+
+def get_session():
+    """The current participant's Session, created on the first run"""
+    session = st.session_state.get(SESSION_KEY)
+    if session is None:
+        session = Session()
+        st.session_state[SESSION_KEY] = session
+    return session
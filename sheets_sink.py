@@ -0,0 +1,312 @@
+import atexit
+import random
+import threading
+import time
+from collections import deque
+
+from storage import TRIAL_COLUMNS
+
+# Column order of the mirrored sheet
+COLUMNS = TRIAL_COLUMNS
+
+# Quota exhausted (429) and transient server errors; anything else is not retried
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HeaderMismatch(Exception):
+    """Row 1 of the worksheet names other columns than the sink writes"""
+
+
+def _status(error):
+    """HTTP status of a gspread APIError (or anything carrying .response); None for network errors"""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def service_account_worksheet(config):
+    """
+    Worksheet opener for the [gsheets] table of secrets.toml:
+    spreadsheet_key, optional worksheet (default "trials") and a
+    [gsheets.service_account] table with the service account JSON fields.
+    """
+    spreadsheet_key = config["spreadsheet_key"]
+    title = config.get("worksheet", "trials")
+    account = dict(config["service_account"])
+
+    def open_worksheet():
+        # Imported here so gspread and google-auth load on the sink thread, not at app startup
+        import gspread
+
+        spreadsheet = gspread.service_account_from_dict(account).open_by_key(spreadsheet_key)
+        try:
+            return spreadsheet.worksheet(title)
+        except gspread.WorksheetNotFound:
+            return spreadsheet.add_worksheet(title, rows=1000, cols=len(COLUMNS))
+
+    return open_worksheet
+
+
+class SheetsSink:
+    """
+    Best-effort mirror of trial rows to a Google Sheet.
+
+    enqueue() appends to an in-memory queue and returns. A daemon thread
+    sends up to batch_size rows per worksheet.append_rows() call, once
+    flush_interval seconds after the oldest queued row (sooner when a batch
+    is full) and never more than one request per min_interval seconds
+    (Sheets allows 60 write requests a minute per user).
+
+    Quota (429), server and network errors back off exponentially with
+    jitter, honouring Retry-After, and the batch goes back to the head of
+    the queue. Other errors drop the batch. Supabase holds the record, so
+    when max_queue rows are waiting the oldest are dropped rather than
+    letting memory grow.
+
+    Row 1 of the sheet is the header. An empty sheet gets columns as its
+    header; a header that is a prefix of columns (columns added since the
+    sheet was started) is extended in place. Any other header means the
+    rows would land under the wrong names, so the sink stops mirroring,
+    says so once and drops what it is given.
+
+    open_worksheet: callable returning an object with append_rows(),
+         row_values(), update() and col_count/add_cols() (a gspread
+         Worksheet); it is called on the sink thread, so authentication
+         never runs during a rerun
+    """
+
+    def __init__(self, open_worksheet, columns=COLUMNS, batch_size=500, flush_interval=10.0,
+                 min_interval=1.0, max_backoff=120.0, max_queue=100_000, report_interval=300):
+        self.open_worksheet = open_worksheet
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self.max_queue = max_queue
+        self.report_interval = report_interval
+
+        self._rows = deque()
+        self._cond = threading.Condition()
+        self._oldest_at = None
+        self._not_before = 0.0  # monotonic time of the next allowed request
+        self._failures = 0      # consecutive retryable failures
+        self._enqueued = 0
+        self._done = 0          # rows appended or dropped
+        self._closed = False
+        self._flushing = 0
+        self._worksheet = None
+        self._needs_header = True
+        self._header_mismatch = False
+
+        # Stats (guarded by _cond)
+        self._rows_written = 0
+        self._rows_dropped = 0
+        self._requests = 0
+        self._throttled = 0
+        self._errors = 0
+        self._last_append_ms = None
+        self._max_append_ms = 0.0
+        self._last_report = time.monotonic()
+
+        self._thread = threading.Thread(target=self._run, name="sheets-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close, timeout=5.0)
+
+    def enqueue(self, row):
+        """Queue one row dict for the sheet (never blocks on the network)"""
+        values = ["" if row.get(c) is None else row.get(c) for c in self.columns]
+        with self._cond:
+            if not self._rows:
+                self._oldest_at = time.monotonic()
+            self._rows.append(values)
+            self._enqueued += 1
+            if len(self._rows) > self.max_queue:
+                self._rows.popleft()
+                self._rows_dropped += 1
+                self._done += 1
+            if len(self._rows) == 1 or len(self._rows) == self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout=30.0):
+        """Block until every row enqueued before this call is appended or dropped; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._done < target:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": len(self._rows),
+                "rows_written": self._rows_written,
+                "rows_dropped": self._rows_dropped,
+                "requests": self._requests,
+                "throttled": self._throttled,
+                "errors": self._errors,
+                "backoff_s": max(0.0, self._not_before - time.monotonic()),
+                "last_append_ms": self._last_append_ms,
+                "max_append_ms": self._max_append_ms,
+            }
+
+    def close(self, timeout=10.0):
+        """Send what the quota allows within timeout; rows still queued after that are dropped"""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            leftover = len(self._rows)
+            self._rows.clear()
+            self._rows_dropped += leftover
+            self._done += leftover
+            self._cond.notify_all()
+        if leftover:
+            print(f"Sheets sink: {leftover} rows not mirrored at shutdown")
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                now = time.monotonic()
+                if self._rows:
+                    due = max(
+                        self._not_before,
+                        now if (len(self._rows) >= self.batch_size or self._flushing)
+                        else self._oldest_at + self.flush_interval,
+                    )
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                else:
+                    self._cond.wait()
+
+            batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+            self._oldest_at = time.monotonic() if self._rows else None
+            return batch
+
+    def _requeue(self, batch):
+        with self._cond:
+            self._rows.extendleft(reversed(batch))
+            self._oldest_at = time.monotonic()
+            overflow = len(self._rows) - self.max_queue
+            for _ in range(max(0, overflow)):
+                self._rows.popleft()
+            if overflow > 0:
+                self._rows_dropped += overflow
+                self._done += overflow
+                self._cond.notify_all()
+
+    def _append(self, batch):
+        if self._worksheet is None:
+            self._worksheet = self.open_worksheet()
+            self._check_header()
+        values = [self.columns] + batch if self._needs_header else batch
+        self._worksheet.append_rows(values, value_input_option="RAW", insert_data_option="INSERT_ROWS")
+        self._needs_header = False
+
+    def _check_header(self):
+        header = self._worksheet.row_values(1)
+        self._needs_header = not header
+        if not header or header == self.columns:
+            return
+        if header == self.columns[:len(header)]:
+            if self._worksheet.col_count < len(self.columns):
+                self._worksheet.add_cols(len(self.columns) - self._worksheet.col_count)
+            self._worksheet.update([self.columns], "A1", value_input_option="RAW")
+            print(f"Sheets sink: added {self.columns[len(header):]} to the sheet's header")
+            return
+        self._header_mismatch = True
+        raise HeaderMismatch(
+            f"the sheet's header {header} does not match the mirrored columns {self.columns}; "
+            "not mirroring (start a new worksheet, or fix row 1)"
+        )
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if self._header_mismatch:
+                with self._cond:
+                    self._rows_dropped += len(batch)
+                    self._done += len(batch)
+                    self._cond.notify_all()
+                continue
+
+            start = time.perf_counter()
+            error = None
+            try:
+                self._append(batch)
+            except Exception as e:
+                error = e
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            status = _status(error) if error is not None else None
+            retry = error is not None and not isinstance(error, HeaderMismatch) and (
+                status is None or status in RETRY_STATUS
+            )
+            if retry:
+                self._failures += 1
+                backoff = min(self.max_backoff, self.min_interval * 2 ** self._failures)
+                delay = max(_retry_after(error) or 0.0, backoff * random.uniform(0.5, 1.0))
+                if status is None:
+                    self._worksheet = None  # reconnect after network errors
+                print(f"Sheets append failed ({len(batch)} rows, status {status}), retrying in {delay:.1f}s: {error}")
+                self._requeue(batch)
+            else:
+                self._failures = 0
+                delay = self.min_interval
+                if isinstance(error, HeaderMismatch):
+                    print(f"Sheets sink: {error}")
+                elif error is not None:
+                    print(f"Sheets append failed ({len(batch)} rows, status {status}), dropping them: {error}")
+
+            with self._cond:
+                self._not_before = time.monotonic() + delay
+                self._requests += 1
+                self._last_append_ms = elapsed_ms
+                self._max_append_ms = max(self._max_append_ms, elapsed_ms)
+                if status == 429:
+                    self._throttled += 1
+                if error is None:
+                    self._rows_written += len(batch)
+                    self._done += len(batch)
+                elif not retry:
+                    self._errors += 1
+                    self._rows_dropped += len(batch)
+                    self._done += len(batch)
+                else:
+                    self._errors += 1
+                self._cond.notify_all()
+
+            self._maybe_report()
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        s = self.stats()
+        print(
+            f"Sheets sink: queue={s['queue_depth']} written={s['rows_written']} dropped={s['rows_dropped']} "
+            f"requests={s['requests']} throttled={s['throttled']} errors={s['errors']}"
+        )
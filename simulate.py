@@ -0,0 +1,362 @@
+"""
+Vectorized Monte Carlo simulator of the streak-bias schedule.
+
+Reproduces the state machine in game.py (the one app.py runs) for millions
+of simulated participants at once: every round updates win_streak,
+loss_streak, bias_rounds_left, bias_rounds_active and the balance for the
+whole population with NumPy array operations.
+
+Choice policies are plug-ins: any callable policy(win_streak, loss_streak, u)
+returning a boolean "take the risk" array, where u is a uniform draw per
+participant the policy may use for randomness.
+
+    python simulate.py --participants 1000000 --policy hot_hand --out sim.json
+    python simulate.py --check   # compare with game.py and with seeded app sessions
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import game
+
+
+# ===== CHOICE POLICIES =====
+def always_risky(win_streak, loss_streak, u):
+    return np.ones(win_streak.shape, dtype=bool)
+
+
+def random_choice(win_streak, loss_streak, u):
+    return u < 0.5
+
+
+def gamblers_fallacy(win_streak, loss_streak, u):
+    """Expects streaks to reverse: bets after losses, plays safe after wins"""
+    return np.where(loss_streak >= 2, True, np.where(win_streak >= 2, False, u < 0.5))
+
+
+def hot_hand(win_streak, loss_streak, u):
+    """Expects streaks to continue: bets after wins, plays safe after losses"""
+    return np.where(win_streak >= 2, True, np.where(loss_streak >= 2, False, u < 0.5))
+
+
+POLICIES = {
+    "always_risky": always_risky,
+    "random": random_choice,
+    "gamblers_fallacy": gamblers_fallacy,
+    "hot_hand": hot_hand,
+}
+
+
+# p_win lookup tables indexed by bias_rounds_left (index 0 is never used while biased)
+_WIN_P = np.array([0.5] + [game.WIN_STREAK_P.get(k, 0.5) for k in range(1, game.BIAS_WINDOW + 1)])
+_LOSS_P = np.array([0.5] + [game.LOSS_STREAK_P.get(k, 0.5) for k in range(1, game.BIAS_WINDOW + 1)])
+
+
+# ===== VECTORIZED ENGINE =====
+def simulate_block(policy, draws, n, rounds=game.ROUNDS_PER_BLOCK, trace=False):
+    """
+    One block for n participants.
+
+    draws: callable returning (u_outcome, u_policy), two arrays of n uniforms, once per round
+    trace: also return per-round outcome (1 win, -1 loss, 0 safe) and p_win (nan on safe)
+    """
+    win_streak = np.zeros(n, dtype=np.int16)
+    loss_streak = np.zeros(n, dtype=np.int16)
+    bias_left = np.zeros(n, dtype=np.int8)
+    bias_active = np.zeros(n, dtype=bool)
+    balance = np.full(n, game.START_BALANCE, dtype=np.int32)
+    activations = np.zeros(n, dtype=np.int16)
+
+    # Completed streak lengths (a safe choice does not end a streak)
+    win_runs = np.zeros(rounds + 1, dtype=np.int64)
+    loss_runs = np.zeros(rounds + 1, dtype=np.int64)
+
+    if trace:
+        outcomes = np.zeros((rounds, n), dtype=np.int8)
+        p_wins = np.full((rounds, n), np.nan)
+
+    for t in range(rounds):
+        u_outcome, u_policy = draws()
+        risky = np.asarray(policy(win_streak, loss_streak, u_policy), dtype=bool)
+
+        # biased_risk_outcome()
+        biased = (bias_left > 0) & bias_active
+        p_win = np.full(n, 0.5)
+        p_win = np.where(biased & (win_streak >= game.STREAK_TRIGGER), _WIN_P[bias_left], p_win)
+        p_win = np.where(biased & (loss_streak >= game.STREAK_TRIGGER), _LOSS_P[bias_left], p_win)
+        win = risky & (u_outcome < p_win)
+        loss = risky & ~win
+
+        # consume_bias_round() on every risky draw
+        used = risky & (bias_left > 0)
+        bias_left = bias_left - used
+        bias_active &= ~(used & (bias_left == 0))
+
+        balance += np.where(risky, np.where(win, game.WIN_PAYOFF, game.LOSS_PAYOFF), game.SAFE_PAYOFF)
+
+        # update_streaks()
+        ended = loss & (win_streak > 0)
+        win_runs += np.bincount(win_streak[ended], minlength=rounds + 1)
+        ended = win & (loss_streak > 0)
+        loss_runs += np.bincount(loss_streak[ended], minlength=rounds + 1)
+
+        win_streak = np.where(win, win_streak + 1, np.where(loss, 0, win_streak)).astype(np.int16)
+        loss_streak = np.where(loss, loss_streak + 1, np.where(win, 0, loss_streak)).astype(np.int16)
+
+        opened = ~bias_active & (
+            (win & (win_streak == game.STREAK_TRIGGER)) | (loss & (loss_streak == game.STREAK_TRIGGER))
+        )
+        bias_left = np.where(opened, game.BIAS_WINDOW, bias_left).astype(np.int8)
+        bias_active |= opened
+        activations += opened
+
+        if trace:
+            outcomes[t] = np.where(win, 1, np.where(loss, -1, 0))
+            p_wins[t] = np.where(risky, p_win, np.nan)
+
+    # Streaks still running when the block ends
+    win_runs += np.bincount(win_streak[win_streak > 0], minlength=rounds + 1)
+    loss_runs += np.bincount(loss_streak[loss_streak > 0], minlength=rounds + 1)
+
+    result = {
+        "balance": balance,
+        "activations": activations,
+        "win_runs": win_runs,
+        "loss_runs": loss_runs,
+    }
+    if trace:
+        result["outcomes"] = outcomes
+        result["p_win"] = p_wins
+    return result
+
+
+# ===== SCALAR REFERENCE (game.py, exactly as app.py calls it) =====
+class _FixedDraw:
+    """random.Random stand-in that returns a pre-drawn uniform"""
+
+    def __init__(self, u):
+        self.u = u
+
+    def random(self):
+        return self.u
+
+
+def simulate_block_scalar(policy, u_outcome, u_policy, rounds=game.ROUNDS_PER_BLOCK, rng=None):
+    """
+    One participant, one block, one round at a time through game.py.
+
+    rng: draw outcomes from this generator instead of u_outcome[t], one draw
+    per risky choice as the app does (u_outcome is then ignored)
+    """
+    win_streak = loss_streak = bias_left = 0
+    bias_active = False
+    balance = game.START_BALANCE
+    activations = 0
+    win_runs = [0] * (rounds + 1)
+    loss_runs = [0] * (rounds + 1)
+    outcomes = []
+    p_wins = []
+
+    for t in range(rounds):
+        risky = bool(policy(np.array([win_streak]), np.array([loss_streak]), np.array([u_policy[t]]))[0])
+        if risky:
+            outcome, p_win = game.biased_risk_outcome(
+                win_streak, loss_streak, bias_left, bias_active,
+                rng=rng if rng is not None else _FixedDraw(u_outcome[t]),
+            )
+            bias_left, bias_active = game.consume_bias_round(bias_left, bias_active)
+            if outcome == 1:
+                balance += game.WIN_PAYOFF
+                last = "win"
+                if loss_streak:
+                    loss_runs[loss_streak] += 1
+            else:
+                balance += game.LOSS_PAYOFF
+                last = "loss"
+                if win_streak:
+                    win_runs[win_streak] += 1
+        else:
+            balance += game.SAFE_PAYOFF
+            last = "safe"
+            outcome, p_win = 0, float("nan")
+
+        was_active = bias_active
+        win_streak, loss_streak, bias_left, bias_active = game.update_streaks(
+            last, win_streak, loss_streak, bias_left, bias_active
+        )
+        activations += bias_active and not was_active
+        outcomes.append(outcome)
+        p_wins.append(p_win)
+
+    if win_streak:
+        win_runs[win_streak] += 1
+    if loss_streak:
+        loss_runs[loss_streak] += 1
+
+    return {
+        "balance": balance,
+        "activations": activations,
+        "win_runs": win_runs,
+        "loss_runs": loss_runs,
+        "outcomes": outcomes,
+        "p_win": p_wins,
+    }
+
+
+def check_against_scalar(policy, n=2000, seed=0, rounds=game.ROUNDS_PER_BLOCK):
+    """Run both engines on the same draws; raises AssertionError on any difference"""
+    rng = np.random.default_rng(seed)
+    u = [(rng.random(n), rng.random(n)) for _ in range(rounds)]
+    it = iter(u)
+    vec = simulate_block(policy, lambda: next(it), n, rounds, trace=True)
+
+    win_runs = np.zeros(rounds + 1, dtype=np.int64)
+    loss_runs = np.zeros(rounds + 1, dtype=np.int64)
+    for i in range(n):
+        ref = simulate_block_scalar(policy, [d[0][i] for d in u], [d[1][i] for d in u], rounds)
+        assert ref["balance"] == vec["balance"][i], f"balance differs for participant {i}"
+        assert ref["activations"] == vec["activations"][i], f"activations differ for participant {i}"
+        assert ref["outcomes"] == vec["outcomes"][:, i].tolist(), f"outcomes differ for participant {i}"
+        assert np.allclose(ref["p_win"], vec["p_win"][:, i], equal_nan=True), f"p_win differs for participant {i}"
+        win_runs += ref["win_runs"]
+        loss_runs += ref["loss_runs"]
+    assert (win_runs == vec["win_runs"]).all(), "win streak lengths differ"
+    assert (loss_runs == vec["loss_runs"]).all(), "loss streak lengths differ"
+
+
+class _RecordedDraw:
+    """Passes draws through from rng and keeps them, in order"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = []
+
+    def random(self):
+        u = self.rng.random()
+        self.draws.append(u)
+        return u
+
+
+def check_against_sessions(policy, seeds=range(200), seed=0, blocks=game.BLOCKS, rounds=game.ROUNDS_PER_BLOCK):
+    """
+    Play seeded sessions the way the app does - game.session_rng(seed) as
+    the outcome stream, one draw per risky choice, carried over from block
+    to block - and compare every round's outcome and p_win with the
+    vectorized engine fed the draws each session used in that round.
+    Raises AssertionError on any difference.
+    """
+    seeds = list(seeds)
+    n = len(seeds)
+    policy_rng = np.random.default_rng(seed)
+    streams = [game.session_rng(session_seed, "outcome") for session_seed in seeds]
+
+    for b in range(blocks):
+        u_policy = policy_rng.random((rounds, n))
+        u_outcome = np.full((rounds, n), np.nan)  # safe rounds draw nothing
+        played = []
+        for i, stream in enumerate(streams):
+            recorded = _RecordedDraw(stream)
+            ref = simulate_block_scalar(policy, None, u_policy[:, i], rounds, rng=recorded)
+            risky_rounds = [t for t, outcome in enumerate(ref["outcomes"]) if outcome != 0]
+            u_outcome[risky_rounds, i] = recorded.draws
+            played.append(ref)
+
+        it = iter(zip(u_outcome, u_policy))
+        vec = simulate_block(policy, lambda: next(it), n, rounds, trace=True)
+        for i, ref in enumerate(played):
+            where = f"seed {seeds[i]}, block {b + 1}"
+            assert ref["outcomes"] == vec["outcomes"][:, i].tolist(), f"outcomes differ for {where}"
+            assert np.allclose(ref["p_win"], vec["p_win"][:, i], equal_nan=True), f"p_win differs for {where}"
+            assert ref["balance"] == vec["balance"][i], f"balance differs for {where}"
+
+
+# ===== POPULATION RUNS =====
+def _histogram(counts, offset=0):
+    return {int(i + offset): int(c) for i, c in enumerate(counts) if c}
+
+
+def _balance_summary(hist, offset):
+    values = np.arange(len(hist)) + offset
+    total = hist.sum()
+    cdf = np.cumsum(hist) / total
+    pct = {f"p{q}": int(values[np.searchsorted(cdf, q / 100)]) for q in (5, 25, 50, 75, 95)}
+    return {"mean": float((values * hist).sum() / total), **pct, "histogram": _histogram(hist, offset)}
+
+
+def simulate(policy, participants, seed=0, blocks=game.BLOCKS, rounds=game.ROUNDS_PER_BLOCK,
+             chunk_size=1_000_000):
+    """Simulate every block for the whole population; returns per-block distributions"""
+    min_balance = game.START_BALANCE + rounds * min(game.LOSS_PAYOFF, game.SAFE_PAYOFF)
+    max_balance = game.START_BALANCE + rounds * game.WIN_PAYOFF
+    balance_hist = np.zeros((blocks, max_balance - min_balance + 1), dtype=np.int64)
+    activation_hist = np.zeros((blocks, rounds + 1), dtype=np.int64)
+    win_runs = np.zeros((blocks, rounds + 1), dtype=np.int64)
+    loss_runs = np.zeros((blocks, rounds + 1), dtype=np.int64)
+
+    chunks = range(0, participants, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    for start, chunk_seed in zip(chunks, seeds):
+        n = min(chunk_size, participants - start)
+        rng = np.random.default_rng(chunk_seed)
+
+        def draws():
+            return rng.random(n), rng.random(n)
+
+        for b in range(blocks):
+            r = simulate_block(policy, draws, n, rounds)
+            balance_hist[b] += np.bincount(r["balance"] - min_balance, minlength=balance_hist.shape[1])
+            activation_hist[b] += np.bincount(r["activations"], minlength=rounds + 1)
+            win_runs[b] += r["win_runs"]
+            loss_runs[b] += r["loss_runs"]
+
+    return {
+        f"block_{b + 1}": {
+            "final_balance": _balance_summary(balance_hist[b], min_balance),
+            "bias_window_activations": _histogram(activation_hist[b]),
+            "win_streak_lengths": _histogram(win_runs[b]),
+            "loss_streak_lengths": _histogram(loss_runs[b]),
+        }
+        for b in range(blocks)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=100_000)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--out", default=None, help="write the JSON result here (default: stdout)")
+    parser.add_argument("--check", action="store_true",
+                        help="verify every policy against the scalar game.py code and seeded sessions, and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        for name, policy in POLICIES.items():
+            check_against_scalar(policy, seed=args.seed)
+            check_against_sessions(policy, seed=args.seed)
+            print(f"{name}: vectorized engine matches game.py and seeded sessions")
+        return
+
+    start = time.perf_counter()
+    result = simulate(POLICIES[args.policy], args.participants, args.seed, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "policy": args.policy,
+        "participants": args.participants,
+        "seed": args.seed,
+        "seconds": round(elapsed, 3),
+        "blocks": result,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text if not args.out else f"Wrote {args.out} ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Where trial rows end up. TrialWriter and WalReplayer call insert_many() of
+# one StorageBackend, chosen with a spec string (open_storage):
+#
+#   supabase           experiment_data in Supabase (credentials from st.secrets)
+#   sqlite:<path>      a local SQLite table with the same columns and key
+#   jsonl:<path>       append-only JSON lines, one row per line
+#   a,b,...            fan-out: the first is the system of record, the rest
+#                      are best-effort copies
+#
+# Every backend skips (or, for JSONL, tolerates) a trial_key it has already
+# stored, since the writer retries batches and the WAL replays them.
+#
+# Besides experiment_data there is trial_timing: one row per trial with the
+# time it spent queued and the time until the database acknowledged it,
+# known only after the trial row itself is written (experiment.py). A
+# backend is opened per table; JSONL puts other tables in sibling files
+# (trials.jsonl -> trials.trial_timing.jsonl).
+
+TRIAL_TABLE = "experiment_data"
+TIMING_TABLE = "trial_timing"
+
+# Columns of experiment_data written by the app (the keys of log_trial()'s row)
+TRIAL_COLUMNS = [
+    "trial_key", "participant_id", "order_name", "block", "condition", "round",
+    "choice", "outcome", "p_win", "win_streak", "loss_streak", "balance",
+    "timestamp", "rng_seed", "reaction_time_ms", "client_reaction_time_ms",
+    "render_ms", "callback_ms", "enqueue_ms",
+]
+
+# Columns of trial_timing (experiment.record_commit)
+TIMING_COLUMNS = ["trial_key", "queue_ms", "commit_ms", "batch_rows"]
+
+TABLE_COLUMNS = {TRIAL_TABLE: TRIAL_COLUMNS, TIMING_TABLE: TIMING_COLUMNS}
+
+
+class StorageBackend:
+    """
+    insert(row) / insert_many(rows): write rows, raising on failure so the
+        caller can spool and retry them
+    flush(): make everything written so far durable
+    health(): counters and the last error, for the metrics endpoint
+    """
+
+    name = "storage"
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._errors = 0
+        self._insert_ms = 0.0
+        self._last_ok_at = None
+        self._last_error_at = None
+        self._last_error = None
+
+    def insert(self, row):
+        self.insert_many([row])
+
+    def insert_many(self, rows):
+        if not rows:
+            return
+        start = time.perf_counter()
+        try:
+            self._insert_many(rows)
+        except Exception as e:
+            with self._stats_lock:
+                self._errors += 1
+                self._last_error_at = time.time()
+                self._last_error = f"{type(e).__name__}: {e}"
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._batches += 1
+            self._rows += len(rows)
+            self._insert_ms += elapsed_ms
+            self._last_ok_at = time.time()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def health(self):
+        with self._stats_lock:
+            return {
+                "ok": self._last_error_at is None or (self._last_ok_at or 0) > self._last_error_at,
+                "batches": self._batches,
+                "rows": self._rows,
+                "errors": self._errors,
+                "avg_insert_ms": self._insert_ms / self._batches if self._batches else None,
+                "last_error": self._last_error,
+            }
+
+    def _insert_many(self, rows):
+        raise NotImplementedError
+
+
+class SupabaseBackend(StorageBackend):
+    """
+    Multi-row upsert into table; existing trial_keys are skipped
+    and the rows are not sent back (return=minimal).
+
+    credentials: callable returning (url, key), called on the first insert,
+        so the client is only built (and its libraries imported) when needed
+    """
+
+    name = "supabase"
+
+    def __init__(self, credentials, table=TRIAL_TABLE, **pool):
+        super().__init__()
+        self.credentials = credentials
+        self.table = table
+        self.pool = pool
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from supabase_pool import create_pooled_client, pool_config
+
+                url, key = self.credentials()
+                self._client = create_pooled_client(url, key, **{**pool_config(), **self.pool})
+            return self._client
+
+    def _insert_many(self, rows):
+        self.client().table(self.table).upsert(
+            rows, on_conflict="trial_key", ignore_duplicates=True, returning="minimal"
+        ).execute()
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    table in a local SQLite file, trial_key as primary key (insert or
+    ignore). One transaction per batch; WAL journal with synchronous=NORMAL,
+    so a committed batch survives the process dying. Columns added to the
+    table since the file was created are added to it on open.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, table=TRIAL_TABLE):
+        super().__init__()
+        self.path = path
+        self.table = table
+        self.columns = TABLE_COLUMNS[table]
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("pragma journal_mode=wal")
+        self._db.execute("pragma synchronous=normal")
+        self._db.execute("pragma busy_timeout=5000")
+        columns = ", ".join("trial_key text primary key" if c == "trial_key" else c for c in self.columns)
+        self._db.execute(
+            f"create table if not exists {table} ({columns}, "
+            f"inserted_at text not null default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')))"
+        )
+        existing = {row[1] for row in self._db.execute(f"pragma table_info({table})")}
+        for column in self.columns:
+            if column not in existing:
+                self._db.execute(f"alter table {table} add column {column}")
+        self._sql = (
+            f"insert or ignore into {table} ({', '.join(self.columns)}) "
+            f"values ({', '.join('?' for _ in self.columns)})"
+        )
+
+    def _insert_many(self, rows):
+        values = [tuple(row.get(c) for c in self.columns) for row in rows]
+        with self._lock:
+            self._db.execute("begin")
+            try:
+                self._db.executemany(self._sql, values)
+            except BaseException:
+                self._db.execute("rollback")
+                raise
+            self._db.execute("commit")
+
+    def flush(self):
+        with self._lock:
+            self._db.execute("pragma wal_checkpoint(passive)")
+
+
+class JSONLBackend(StorageBackend):
+    """
+    Append-only JSON lines, one row per line, written with one write() per
+    batch. fsync=True syncs every batch (like trial_wal); otherwise only
+    flush() and close() do. Appending cannot skip a trial_key that is
+    already in the file, so a retried batch can repeat rows; readers should
+    keep the first row per trial_key.
+    """
+
+    name = "jsonl"
+
+    def __init__(self, path, fsync=True):
+        super().__init__()
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _insert_many(self, rows):
+        data = "".join(json.dumps(row, default=str, separators=(",", ":")) + "\n" for row in rows)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+
+class FanOutBackend(StorageBackend):
+    """
+    Writes every batch to each backend in turn. The first is the system of
+    record: its errors are raised (the writer spools the batch to the WAL
+    and retries it everywhere). Errors from the others are printed and
+    counted in their own health() only.
+    """
+
+    name = "fanout"
+
+    def __init__(self, backends):
+        super().__init__()
+        self.backends = list(backends)
+
+    def _insert_many(self, rows):
+        primary, *mirrors = self.backends
+        primary.insert_many(rows)
+        for backend in mirrors:
+            try:
+                backend.insert_many(rows)
+            except Exception as e:
+                print(f"Storage mirror {backend.name} failed ({len(rows)} rows): {e}")
+
+    def flush(self):
+        for backend in self.backends:
+            backend.flush()
+
+    def health(self):
+        merged = super().health()
+        for backend in self.backends:
+            for key, value in backend.health().items():
+                merged[f"{backend.name}_{key}"] = value
+        return merged
+
+
+def open_storage(spec, supabase_credentials=None, table=TRIAL_TABLE):
+    """A StorageBackend writing table for spec (see the top of this module)"""
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if len(parts) > 1:
+        return FanOutBackend([open_storage(part, supabase_credentials, table) for part in parts])
+    kind, _, location = spec.strip().partition(":")
+    if kind == "supabase":
+        if supabase_credentials is None:
+            raise ValueError("The supabase backend needs credentials")
+        return SupabaseBackend(supabase_credentials, table)
+    if kind == "sqlite" and location:
+        return SQLiteBackend(location, table)
+    if kind == "jsonl" and location:
+        if table != TRIAL_TABLE:
+            root, ext = os.path.splitext(location)
+            location = f"{root}.{table}{ext or '.jsonl'}"
+        return JSONLBackend(location)
+    raise ValueError(f"Unknown storage {spec!r}; expected supabase, sqlite:<path>, jsonl:<path> or a comma list")
@@ -0,0 +1,63 @@
+import os
+
+# Supabase client with an explicitly sized, keep-alive HTTP pool.
+#
+# create_client() on its own builds a private httpx.Client: up to 100
+# connections of which 20 stay alive, and a 120 s timeout, so one stalled
+# insert holds the writer thread for two minutes. Here the pool and the
+# timeouts are set explicitly. The httpx client is shared by every thread
+# that writes (httpx pools are thread-safe), and the PostgREST sub-client,
+# which supabase-py creates lazily and without a lock, is built before the
+# client is handed out.
+
+POOL_DEFAULTS = {
+    "max_connections": 4,       # writer + WAL replayer, with headroom
+    "keepalive_expiry": 60.0,   # seconds an idle connection is kept
+    "timeout": 10.0,            # read/write limit for each request
+    "connect_timeout": 3.0,
+    "pool_timeout": 5.0,        # longest wait for a free connection
+    "http2": True,              # as supabase-py; HTTP/1.1 where the server has no h2
+}
+
+ENV_PREFIX = "ISM_DB_"
+
+
+def pool_config(environ=os.environ):
+    """POOL_DEFAULTS overridden by ISM_DB_MAX_CONNECTIONS, ISM_DB_TIMEOUT, ... (ISM_DB_HTTP2=0 turns h2 off)"""
+    config = dict(POOL_DEFAULTS)
+    for name, default in POOL_DEFAULTS.items():
+        value = environ.get(ENV_PREFIX + name.upper())
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            config[name] = value not in ("0", "false", "no")
+        else:
+            config[name] = type(default)(value)
+    return config
+
+
+def create_http_client(max_connections, keepalive_expiry, timeout, connect_timeout, pool_timeout, http2):
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,  # never close a connection just to reopen it
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout),
+        http2=http2,
+        follow_redirects=True,
+    )
+
+
+def create_pooled_client(url, key, **config):
+    """create_client(url, key) on an httpx pool sized by config (see POOL_DEFAULTS)"""
+    # Imported here so the client libraries load on the first write, not on the first page view
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
+    http = create_http_client(**{**POOL_DEFAULTS, **config})
+    client = create_client(url, key, options=SyncClientOptions(httpx_client=http))
+    client.postgrest  # build the lazy PostgREST client while only this thread can see it
+    return client
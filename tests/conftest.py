@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules are top-level files in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoints import SQLiteCheckpointStore, new_token  # noqa: E402
+from session import Session  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Checkpoint store; override in a test module to run against other backends"""
+    return SQLiteCheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+
+
+@pytest.fixture
+def session(store):
+    """A participant at the start of block 1, with a first checkpoint in store"""
+    s = Session(rng_seed=1234)
+    s.started = True
+    s.block = 1
+    s.resume_token = new_token()
+    store.create(s)
+    return s
@@ -0,0 +1,24 @@
+from admission import AdmissionController
+
+
+def test_session_from_another_worker_waits_when_full():
+    admission = AdmissionController(2)
+    assert admission.try_admit("a") and admission.try_admit("b")
+    assert not admission.try_admit("new")
+
+    # "moved" started on another worker and now reruns here
+    assert not admission.heartbeat("moved")
+    assert admission.stats()["active"] == 2
+    assert admission.queue_position("moved") == 0  # ahead of those not started yet
+
+    admission.release("a")
+    assert not admission.try_admit("new")
+    assert admission.try_admit("moved")
+    assert admission.heartbeat("moved")
+
+
+def test_session_from_another_worker_takes_a_free_slot():
+    admission = AdmissionController(2)
+    assert admission.try_admit("a")
+    assert admission.heartbeat("moved")
+    assert admission.stats()["active"] == 2
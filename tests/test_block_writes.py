@@ -0,0 +1,51 @@
+import pytest
+
+import experiment
+from block_writes import PendingRowSweeper
+
+
+@pytest.fixture
+def block_mode(store, session, monkeypatch):
+    """A participant in block mode, and every row handed to the writer and mirror"""
+    written = []
+    monkeypatch.setattr(experiment, "TRIAL_WRITES", "block")
+    monkeypatch.setattr(experiment, "init_checkpoints", lambda: store)
+    monkeypatch.setattr(experiment, "write_trial_rows", written.extend)
+    return store, session, written
+
+
+def log_rounds(s, rounds):
+    for r in rounds:
+        s.round = r
+        s.last_choice = s.last_outcome = "safe"
+        experiment.log_trial(s)
+
+
+def test_returning_participant_skips_swept_rows(block_mode):
+    store, s, written = block_mode
+    log_rounds(s, range(3))
+    sweeper = PendingRowSweeper(store, written.extend, idle_seconds=-60, interval=3600)
+    assert sweeper.sweep() == 3
+
+    # The participant comes back in the same browser session and finishes the block
+    log_rounds(s, range(3, 5))
+    experiment.flush_block(s)
+    assert [row["round"] for row in written] == [0, 1, 2, 3, 4]
+    assert s.pending_rows == [] and store.load(s.resume_token).pending_rows == []
+
+
+def test_racing_sweeps_write_each_row_once(block_mode):
+    store, s, written = block_mode
+    log_rounds(s, range(3))
+    sweepers = [PendingRowSweeper(store, written.extend, idle_seconds=-60) for _ in range(2)]
+    assert sum(sweeper.sweep() for sweeper in sweepers) == 3
+    experiment.flush_block(s)
+    assert [row["round"] for row in written] == [0, 1, 2]
+
+
+def test_row_the_store_refused_is_written_at_once(block_mode, monkeypatch):
+    store, s, written = block_mode
+    monkeypatch.setattr(store, "append_pending", lambda s, rows: False)
+    log_rounds(s, range(2))
+    assert [row["round"] for row in written] == [0, 1]
+    assert s.pending_rows == []
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+
+import pytest
+
+from checkpoints import FileCheckpointStore, SQLiteCheckpointStore
+
+
+@pytest.fixture(params=["sqlite", "files"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteCheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    return FileCheckpointStore(str(tmp_path / "sessions"))
+
+
+def play_round(s):
+    s.round += 1
+    s.balance += 1
+    s.outcome_draws += 1
+
+
+def test_failed_save_keeps_version(store, session, monkeypatch):
+    s = session
+    for _ in range(5):
+        play_round(s)
+        store.save(s)
+    version = s.checkpoint_version
+
+    update = store._update
+
+    def failing_update(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(store, "_update", failing_update)
+    play_round(s)
+    store.save(s)
+    assert s.checkpoint_version == version
+    monkeypatch.setattr(store, "_update", update)
+
+    play_round(s)
+    store.save(s)
+    assert store.refresh(s) is None
+    assert store.stats()["conflicts"] == 0
+    assert store.stats()["errors"] == 1
+    restored = store.load(s.resume_token)
+    assert (restored.round, restored.balance, restored.checkpoint_version) == (7, s.balance, version + 1)
+
+
+def test_refresh_refuses_copy_behind_session(store, session):
+    s = session
+    play_round(s)
+    store.save(s)
+    # A save that reached the store but was reported as failed: the stored
+    # version is ahead while the stored cursor is behind
+    s.checkpoint_version -= 1
+    play_round(s)
+    play_round(s)
+
+    assert store.refresh(s) is None
+    assert s.round == 3
+    assert store.stats()["stale_refused"] == 1
+
+    store.save(s)
+    assert store.load(s.resume_token).round == 3
+    assert store.stats()["conflicts"] == 0
+
+
+def test_refresh_returns_copy_ahead_of_session(store, session):
+    s = session
+    other = store.load(s.resume_token)  # the same participant on another worker
+    play_round(other)
+    store.save(other)
+
+    fresh = store.refresh(s)
+    assert fresh is not None and fresh.round == 1
+
+
+def test_pending_rows_are_kept_outside_the_cursor(store, session):
+    s = session
+    rows = [{"trial_key": f"{s.participant_id}:1:{i}", "round": i} for i in range(3)]
+    for row in rows:
+        s.pending_rows.append(row)
+        store.append_pending(s, [row])
+        play_round(s)
+        store.save(s)
+    store.append_pending(s, rows[:1])  # a repeated append keeps one copy
+
+    assert store.load(s.resume_token).pending_rows == rows
+    assert store.abandoned_tokens(-60) == [s.resume_token] and store.abandoned_tokens(60) == []
+
+    assert store.claim_pending(s.resume_token) == rows
+    assert store.claim_pending(s.resume_token) == []
+    assert store.load(s.resume_token).pending_rows == []
+    assert store.abandoned_tokens(-60) == []
+
+
+def test_claims_racing_appends_hand_out_every_row_once(store, session):
+    keys = [f"{session.participant_id}:1:{i}" for i in range(200)]
+    claimed = []
+
+    def append():
+        for key in keys:
+            store.append_pending(session, [{"trial_key": key}])
+
+    def claim():
+        for _ in range(100):
+            claimed.extend(row["trial_key"] for row in store.claim_pending(session.resume_token))
+
+    threads = [threading.Thread(target=append)] + [threading.Thread(target=claim) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    claimed.extend(row["trial_key"] for row in store.claim_pending(session.resume_token))
+    assert sorted(claimed) == sorted(keys)
@@ -0,0 +1,8 @@
+import pytest
+
+import simulate
+
+
+@pytest.mark.parametrize("name", sorted(simulate.POLICIES))
+def test_vectorized_engine_matches_seeded_sessions(name):
+    simulate.check_against_sessions(simulate.POLICIES[name], seeds=range(50))
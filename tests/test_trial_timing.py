@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+import experiment
+
+
+@pytest.fixture
+def resumed(store, session, monkeypatch):
+    """A participant who reloaded in the middle of round 3, and the rows they log"""
+    session.round = 3
+    store.save(session)
+
+    current = {"session": store.load(session.resume_token)}
+    rows = []
+    monkeypatch.setattr(experiment, "TRIAL_WRITES", "trial")
+    monkeypatch.setattr(experiment, "TRIAL_TIMING", True)
+    monkeypatch.setattr(experiment, "get_or_resume_session", lambda: current["session"])
+    monkeypatch.setattr(experiment, "save_checkpoint", lambda s: None)
+    monkeypatch.setattr(experiment, "write_trial_rows", rows.extend)
+    return current["session"], rows
+
+
+def play(s):
+    s.render_ns = time.perf_counter_ns()
+    experiment.choose_safe()
+    experiment.continue_after_feedback()
+
+
+def test_resumed_round_logs_no_latency(resumed):
+    s, rows = resumed
+    assert not s.timing_valid
+
+    play(s)
+    assert rows[-1]["round"] == 3
+    assert rows[-1]["reaction_time_ms"] is None
+    assert rows[-1]["render_ms"] is None
+    # the choice callback itself ran here, so it is still measured
+    assert rows[-1]["callback_ms"] is not None
+
+
+def test_timing_resumes_with_next_round(resumed):
+    s, rows = resumed
+    play(s)
+    assert s.timing_valid
+
+    play(s)
+    assert rows[-1]["round"] == 4
+    assert rows[-1]["reaction_time_ms"] is not None
+    assert rows[-1]["render_ms"] is not None
+
+
+def test_enqueue_ms_leaves_out_the_feedback_screen(resumed):
+    s, rows = resumed
+    s.render_ns = time.perf_counter_ns()
+    experiment.choose_safe()
+    time.sleep(0.05)  # the participant reads the feedback
+    experiment.continue_after_feedback()
+    assert rows[-1]["enqueue_ms"] < 50
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import time
+
+from trial_wal import TrialWAL, WalReplayer, open_worker_wal
+
+
+def run_worker(base_dir, name, n_rows, out_path):
+    """One app.py worker: appends rows to its WAL while its replayer drains it"""
+    wal = open_worker_wal(base_dir, segment_max_rows=7)
+    inserted = []
+    replayer = WalReplayer(wal, inserted.extend, retry_interval=0.01)
+    for i in range(n_rows):
+        wal.append([{"trial_key": f"{name}:{i}"}])
+        if i % 5 == 0:
+            replayer.wake()
+    deadline = time.monotonic() + 30
+    while wal.backlog_rows() and time.monotonic() < deadline:
+        replayer.wake()
+        time.sleep(0.01)
+    with open(out_path, "w") as f:
+        f.write("\n".join(row["trial_key"] for row in inserted))
+
+
+def crash_worker(base_dir, n_rows):
+    """A worker that dies with rows still in its WAL"""
+    wal = open_worker_wal(base_dir)
+    wal.append([{"trial_key": f"crashed:{i}"} for i in range(n_rows)])
+    os._exit(1)
+
+
+def test_workers_sharing_a_wal_dir_lose_no_rows(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    base_dir = str(tmp_path / "trial_wal")
+    workers = [
+        ctx.Process(target=run_worker, args=(base_dir, name, 300, str(tmp_path / f"{name}.txt")))
+        for name in ("a", "b")
+    ]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+        assert p.exitcode == 0
+
+    inserted = []
+    for name in ("a", "b"):
+        inserted += (tmp_path / f"{name}.txt").read_text().split("\n")
+    assert sorted(inserted) == sorted(f"{name}:{i}" for name in ("a", "b") for i in range(300))
+
+
+def test_dead_workers_rows_are_taken_over(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    base_dir = str(tmp_path / "trial_wal")
+    p = ctx.Process(target=crash_worker, args=(base_dir, 12))
+    p.start()
+    p.join(60)
+    # Rows from a version that wrote to the base directory itself
+    with open(os.path.join(base_dir, "trial-wal-000001.jsonl"), "w") as f:
+        f.write('{"trial_key": "legacy:0"}\n')
+
+    wal = open_worker_wal(base_dir)
+    assert wal.backlog_rows() == 13
+    rows = [row["trial_key"] for path in wal.sealed_segments() for row in wal.read_segment(path)]
+    assert sorted(rows) == sorted(["legacy:0"] + [f"crashed:{i}" for i in range(12)])
+    assert [entry.name for entry in os.scandir(base_dir) if entry.is_dir()] == [os.path.basename(wal.directory)]
+
+
+def test_live_workers_wal_is_left_alone(tmp_path):
+    base_dir = str(tmp_path / "trial_wal")
+    other = TrialWAL(os.path.join(base_dir, "elsewhere"))
+    other.append([{"trial_key": "other:0"}])
+
+    wal = open_worker_wal(base_dir)
+    assert wal.adopt(other.directory) == 0
+    assert wal.backlog_rows() == 0 and other.backlog_rows() == 1
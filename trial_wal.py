@@ -0,0 +1,268 @@
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _try_lock(f):
+    """Exclusive lock on an open file, without waiting; released when f is closed"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def open_worker_wal(base_dir, segment_max_rows=5000):
+    """
+    The WAL of this server process, base_dir/<hostname>-<pid>, so that the
+    app.py workers of a host never append to or replay each other's
+    segments. The segments of workers on this host that are gone (nobody
+    holds their directory's lock) and any left directly in base_dir by
+    older versions are moved into it, to be replayed here.
+    """
+    host = socket.gethostname()
+    wal = TrialWAL(os.path.join(base_dir, f"{host}-{os.getpid()}"), segment_max_rows)
+    orphans = [base_dir] + sorted(
+        entry.path for entry in os.scandir(base_dir)
+        if entry.is_dir() and entry.path != wal.directory
+        # Only this host's: a lock on a shared volume says nothing about another host's process
+        and entry.name.rpartition("-")[0] == host and entry.name.rpartition("-")[2].isdigit()
+    )
+    for directory in orphans:
+        rows = wal.adopt(directory)
+        if rows:
+            print(f"WAL: took over {rows} rows from {directory}")
+    return wal
+
+
+class TrialWAL:
+    """
+    Append-only, segmented write-ahead log for trial rows that have not
+    reached the database yet.
+
+    Rows are written as JSON lines to trial-wal-NNNNNN.jsonl. Each append()
+    is one write plus one fsync, so a whole batch is made durable together.
+    The active segment is sealed when it reaches segment_max_rows or when the
+    replayer wants to drain it; only sealed segments are ever replayed.
+
+    The directory belongs to one process, which holds an exclusive lock on
+    its owner.lock for as long as it runs (see open_worker_wal).
+    """
+
+    PREFIX = "trial-wal-"
+    SUFFIX = ".jsonl"
+    LOCK_NAME = "owner.lock"
+
+    def __init__(self, directory, segment_max_rows=5000):
+        self.directory = directory
+        self.segment_max_rows = segment_max_rows
+        os.makedirs(directory, exist_ok=True)
+
+        self._owner = open(os.path.join(directory, self.LOCK_NAME), "a+")
+        if not _try_lock(self._owner):
+            self._owner.close()
+            raise RuntimeError(f"WAL directory {directory} is in use by another process")
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_path = None
+        self._active_rows = 0
+
+        # Pick up segments left behind by a previous run
+        self._seq = 0
+        self._backlog_rows = 0
+        for path in self._segment_paths():
+            self._seq = max(self._seq, self._segment_number(path))
+            self._backlog_rows += len(self.read_segment(path))
+
+        self._appended_rows = 0
+        self._removed_rows = 0
+
+    def append(self, rows):
+        """Durably append a batch of rows (one fsync for the whole batch)"""
+        if not rows:
+            return
+        data = "".join(json.dumps(row, default=str) + "\n" for row in rows)
+        with self._lock:
+            if self._active is None:
+                self._open_segment()
+            self._active.write(data)
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._active_rows += len(rows)
+            self._backlog_rows += len(rows)
+            self._appended_rows += len(rows)
+            if self._active_rows >= self.segment_max_rows:
+                self._seal_locked()
+
+    def seal(self):
+        """Close the active segment so it can be replayed"""
+        with self._lock:
+            self._seal_locked()
+
+    def sealed_segments(self):
+        # Listed under the lock: a segment opened by append() in the middle
+        # of the listing would otherwise be replayed while still written to
+        with self._lock:
+            return [p for p in self._segment_paths() if p != self._active_path]
+
+    def read_segment(self, path):
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn final line from a crash mid-write; the batch it
+                    # belonged to was never fsynced as a whole
+                    break
+        return rows
+
+    def remove_segment(self, path, row_count):
+        os.remove(path)
+        with self._lock:
+            self._backlog_rows = max(0, self._backlog_rows - row_count)
+            self._removed_rows += row_count
+
+    def adopt(self, directory):
+        """
+        Move the segments of another WAL directory into this one, unless a
+        live process owns it. Returns the number of rows taken over.
+        """
+        lock_path = os.path.join(directory, self.LOCK_NAME)
+        try:
+            owner = open(lock_path, "a+")
+        except FileNotFoundError:  # removed by another worker that took it over first
+            return 0
+        with owner:
+            if not _try_lock(owner):
+                return 0
+            rows = 0
+            for path in self._segment_paths(directory):
+                count = len(self.read_segment(path))
+                with self._lock:
+                    self._seq += 1
+                    os.replace(path, self._segment_path(self._seq))
+                    self._backlog_rows += count
+                rows += count
+            try:
+                os.remove(lock_path)
+                os.rmdir(directory)
+            except OSError:
+                pass  # base_dir still holds the worker directories
+        return rows
+
+    def backlog_rows(self):
+        """Rows appended and not yet replayed; cheap enough for every flush"""
+        with self._lock:
+            return self._backlog_rows
+
+    def stats(self):
+        """Counters plus a directory listing, for the metrics endpoint"""
+        segments = len(self._segment_paths())
+        with self._lock:
+            return {
+                "backlog_rows": self._backlog_rows,
+                "backlog_segments": segments,
+                "appended_rows": self._appended_rows,
+                "replayed_rows": self._removed_rows,
+            }
+
+    def _open_segment(self):
+        self._seq += 1
+        self._active_path = self._segment_path(self._seq)
+        self._active = open(self._active_path, "a", encoding="utf-8")
+        self._active_rows = 0
+
+    def _seal_locked(self):
+        if self._active is not None:
+            self._active.close()
+        self._active = None
+        self._active_path = None
+        self._active_rows = 0
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f"{self.PREFIX}{seq:06d}{self.SUFFIX}")
+
+    def _segment_paths(self, directory=None):
+        directory = directory or self.directory
+        names = sorted(
+            n for n in os.listdir(directory)
+            if n.startswith(self.PREFIX) and n.endswith(self.SUFFIX)
+        )
+        return [os.path.join(directory, n) for n in names]
+
+    def _segment_number(self, path):
+        name = os.path.basename(path)
+        return int(name[len(self.PREFIX):-len(self.SUFFIX)])
+
+
+class WalReplayer:
+    """
+    Background thread that drains the WAL to the database in bulk.
+
+    It drains once at startup, then again whenever wake() is called (the
+    writer calls it after every successful flush, i.e. when the backend is
+    reachable) or every retry_interval seconds while a backlog remains.
+    """
+
+    def __init__(self, wal, insert_rows, chunk_size=500, retry_interval=30):
+        self.wal = wal
+        self.insert_rows = insert_rows
+        self.chunk_size = chunk_size
+        self.retry_interval = retry_interval
+
+        self._wake = threading.Event()
+        self._failures = 0
+        self._last_error = None
+        self._last_drain_at = None
+
+        self._thread = threading.Thread(target=self._run, name="trial-wal-replayer", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        if self.wal.backlog_rows():
+            self._wake.set()
+
+    def drain(self):
+        """Replay every WAL segment; stops at the first failed insert. Returns True when empty."""
+        self.wal.seal()
+        for path in self.wal.sealed_segments():
+            rows = self.wal.read_segment(path)
+            try:
+                for i in range(0, len(rows), self.chunk_size):
+                    self.insert_rows(rows[i:i + self.chunk_size])
+            except Exception as e:
+                self._failures += 1
+                self._last_error = str(e)
+                print(f"WAL replay failed ({os.path.basename(path)}): {e}")
+                return False
+            self.wal.remove_segment(path, len(rows))
+            print(f"WAL replay: {len(rows)} rows from {os.path.basename(path)}")
+        self._last_drain_at = time.time()
+        return True
+
+    def stats(self):
+        s = self.wal.stats()
+        s["replay_failures"] = self._failures
+        s["last_replay_error"] = self._last_error
+        s["last_drain_at"] = self._last_drain_at
+        return s
+
+    def _run(self):
+        while True:
+            if self.wal.backlog_rows():
+                self.drain()
+            self._wake.wait(self.retry_interval)
+            self._wake.clear()
@@ -0,0 +1,225 @@
+import atexit
+import threading
+import time
+from collections import deque
+
+
+class TrialWriter:
+    """
+    Process-wide background writer for experiment_data rows.
+
+    Callbacks call enqueue() and return immediately. A daemon thread groups
+    queued rows into one multi-row insert when either batch_size rows are
+    waiting or the oldest row has waited flush_interval seconds.
+
+    insert_rows: callable taking a list of row dicts (one bulk insert)
+    wal: optional TrialWAL; batches that fail to insert, and rows still
+         queued at shutdown, are spooled there instead of being dropped
+    on_flush_ok: optional callable run after every successful insert
+         (used to wake the WAL replayer once the backend is reachable)
+    on_commit: optional callable run after every successful insert with
+         (rows, queue_ms, commit_ms): the batch, each row's time from
+         enqueue until the insert was sent, and the insert's time until the
+         backend acknowledged it (time.perf_counter_ns)
+    keep_failed: without a WAL, keep failed rows in failed_rows (otherwise
+         they are only counted)
+    """
+
+    def __init__(self, insert_rows, batch_size=50, flush_interval=0.5, report_interval=60,
+                 wal=None, on_flush_ok=None, on_commit=None, keep_failed=True):
+        self.insert_rows = insert_rows
+        self.wal = wal
+        self.on_flush_ok = on_flush_ok
+        self.on_commit = on_commit
+        self.keep_failed = keep_failed
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.report_interval = report_interval
+
+        self._rows = deque()  # (perf_counter_ns at enqueue, row)
+        self._cond = threading.Condition()
+        self._oldest_at = None
+        self._enqueued = 0   # rows ever enqueued
+        self._done = 0       # rows written or given up on
+        self._closed = False
+        self._flushing = 0   # callers currently blocked in flush()
+
+        # Stats (guarded by _cond)
+        self._rows_written = 0
+        self._rows_failed = 0
+        self._rows_spooled = 0
+        self._batches = 0
+        self._last_flush_ms = None
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._last_report = time.monotonic()
+
+        self.failed_rows = []
+
+        self._thread = threading.Thread(target=self._run, name="trial-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close, timeout=5.0)
+
+    def enqueue(self, row):
+        """Queue one row for the next bulk insert (never blocks on the network)"""
+        with self._cond:
+            was_empty = not self._rows
+            if was_empty:
+                self._oldest_at = time.monotonic()
+            self._rows.append((time.perf_counter_ns(), row))
+            self._enqueued += 1
+            # Wake the worker to start the interval timer, or because the batch is full
+            if was_empty or len(self._rows) >= self.batch_size:
+                self._cond.notify_all()
+
+    def enqueue_many(self, rows):
+        """Queue several rows together, so they go out in the same bulk insert when they fit in one"""
+        if not rows:
+            return
+        with self._cond:
+            if not self._rows:
+                self._oldest_at = time.monotonic()
+            now_ns = time.perf_counter_ns()
+            self._rows.extend((now_ns, row) for row in rows)
+            self._enqueued += len(rows)
+            self._cond.notify_all()
+
+    def flush(self, timeout=10.0):
+        """
+        Block until every row enqueued before this call has been handled.
+        Returns True if the queue drained in time, False on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued
+            self._flushing += 1
+            self._cond.notify_all()  # wake the worker so it does not wait out the interval
+            try:
+                while self._done < target:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def stats(self):
+        """Snapshot of queue depth and flush latency"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._rows),
+                "rows_written": self._rows_written,
+                "rows_failed": self._rows_failed,
+                "rows_spooled": self._rows_spooled,
+                "batches": self._batches,
+                "last_flush_ms": self._last_flush_ms,
+                "avg_flush_ms": self._total_flush_ms / self._batches if self._batches else None,
+                "max_flush_ms": self._max_flush_ms,
+            }
+
+    def close(self, timeout=10.0):
+        """Flush what we can, then spool anything still queued to the WAL"""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            leftover = [row for _, row in self._rows]
+            self._rows.clear()
+            self._done += len(leftover)
+            self._cond.notify_all()
+        if leftover:
+            self._spool(leftover)
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._rows:
+                    waited = time.monotonic() - self._oldest_at
+                    if (
+                        len(self._rows) >= self.batch_size
+                        or waited >= self.flush_interval
+                        or self._flushing
+                        or self._closed
+                    ):
+                        break
+                    self._cond.wait(self.flush_interval - waited)
+                else:
+                    if self._closed:
+                        return None
+                    self._cond.wait()
+
+            batch = []
+            while self._rows and len(batch) < self.batch_size:
+                batch.append(self._rows.popleft())
+            self._oldest_at = time.monotonic() if self._rows else None
+            return batch
+
+    def _run(self):
+        while True:
+            stamped = self._next_batch()
+            if stamped is None:
+                return
+            batch = [row for _, row in stamped]
+
+            start_ns = time.perf_counter_ns()
+            error = None
+            try:
+                self.insert_rows(batch)
+            except Exception as e:
+                error = e
+            elapsed_ms = (time.perf_counter_ns() - start_ns) / 1e6
+
+            spooled = False
+            if error is not None:
+                print(f"Database error ({len(batch)} rows): {error}")
+                spooled = self._spool(batch)
+
+            with self._cond:
+                self._batches += 1
+                self._last_flush_ms = elapsed_ms
+                self._total_flush_ms += elapsed_ms
+                self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+                if error is None:
+                    self._rows_written += len(batch)
+                else:
+                    self._rows_failed += len(batch)
+                    if spooled:
+                        self._rows_spooled += len(batch)
+                self._done += len(batch)
+                self._cond.notify_all()
+
+            if error is None and self.on_commit is not None:
+                try:
+                    self.on_commit(batch, [(start_ns - ns) / 1e6 for ns, _ in stamped], elapsed_ms)
+                except Exception as e:
+                    print(f"Trial writer commit hook failed: {e}")
+            if error is None and self.on_flush_ok is not None:
+                self.on_flush_ok()
+
+            self._maybe_report()
+
+    def _spool(self, rows):
+        """Hand rows to the WAL; keep them in memory only if that fails too"""
+        if self.wal is not None:
+            try:
+                self.wal.append(rows)
+                return True
+            except OSError as e:
+                print(f"WAL append failed ({len(rows)} rows): {e}")
+        if self.keep_failed:
+            with self._cond:
+                self.failed_rows.extend(rows)
+        return False
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        s = self.stats()
+        print(
+            f"Trial writer: queue={s['queue_depth']} written={s['rows_written']} "
+            f"failed={s['rows_failed']} spooled={s['rows_spooled']} batches={s['batches']} "
+            f"last={s['last_flush_ms']:.0f}ms avg={s['avg_flush_ms']:.0f}ms max={s['max_flush_ms']:.0f}ms"
+        )